@@ -0,0 +1,197 @@
+# bg_classifier.py
+# Shared "is this a Bulgarian channel?" check for build_playlist.py,
+# flatten_m3u.py and tester.py.
+#
+# The keyword lists are compiled once at import into regexes. Keywords are
+# merged into a character trie first, so each pattern is prefix-factored
+# ("bnt", "bnt 1", "bnt world" share one "bnt" branch) and matching costs
+# about the same whether a list has 60 keywords or 6000.
+#
+# Keywords only match whole words: "bg" matches "BG TV" or "bnt_bg" but not
+# "bgcolor", and "tv1" does not match "tv10". A space inside a keyword matches
+# any run of separators, or none ("nova tv" matches "Nova.TV" and "novatv").
+#
+# A channel is scored rather than accepted on the first hit. Each field (name,
+# tvg-id, group-title, URL) adds its weight times the strongest keyword found
+# in it; ambiguous short keywords ("bg", "nova", "tv1") count for little on
+# their own. The stream host adds a score of its own: .bg TLD, hosts listed
+# in bg_known_hosts.txt, and what earlier runs learned (bg_hosts.json, written
+# by build_playlist.py). Host scores are computed once per host and cached.
+
+import json
+import os
+import random
+import re
+
+from common import host_of
+
+KEYWORDS_FILE = "bg_channel_keywords.txt"
+KNOWN_HOSTS_FILE = "bg_known_hosts.txt"  # optional, one host (or parent domain) per line
+HOST_STATS_FILE = "bg_hosts.json"        # per-host {host: [bulgarian, total]} from the last build
+
+# kept from the old flatten_m3u.py list
+EXTRA_KEYWORDS = ["bnt", "nova", "btv", "diema", "bg", "bul", "bulgaria", "канал", "sofia"]
+
+# Keywords that also name plenty of foreign channels; they only add up
+WEAK_KEYWORDS = [
+    "bg", "бг", "bul", "nova", "ring", "k3", "tv1", "tv2", "tv7", "tvn", "planeta",
+    "the voice", "city tv", "europa tv", "evropa", "sofia", "канал", "телевизия",
+]
+
+COUNTRY_TLDS = (".bg", ".бг")
+
+STRONG_WEIGHT = 3.0
+WEAK_WEIGHT = 1.0
+FIELD_WEIGHTS = {"name": 1.0, "tvg_id": 1.0, "group_title": 0.8, "url": 0.5}
+BARE_URL_WEIGHT = 1.0  # a link without metadata is judged on its URL alone
+TLD_SCORE = 3.0
+KNOWN_HOST_SCORE = 4.0
+LEARNED_HOST_SCORE = 2.0
+THRESHOLD = 3.0
+MIN_HOST_SAMPLES = 5  # channels seen on a host before "never Bulgarian" rejects it
+REJECTED_SAMPLE = 0.05  # share of bare links on rejected hosts still tested, so a host can recover
+
+SEPARATOR = " "
+NON_WORD_RE = re.compile(r"[\W_]+")
+
+
+def load_keywords(path=KEYWORDS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
+
+def load_host_stats(path=HOST_STATS_FILE):
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf8") as f:
+            return json.load(f)
+    except ValueError:
+        return {}
+
+
+def normalize_keyword(kw):
+    """Lowercase, with every run of non-alphanumerics turned into one space."""
+    return NON_WORD_RE.sub(SEPARATOR, kw.lower()).strip()
+
+
+def _trie_pattern(node):
+    """Regex source for a trie of dicts; the "" key marks the end of a keyword."""
+    branches = []
+    for ch in sorted(node):
+        if ch == "":
+            continue
+        piece = r"[\W_]*" if ch == SEPARATOR else re.escape(ch)
+        branches.append(piece + _trie_pattern(node[ch]))
+    if not branches:
+        return ""
+    if len(branches) == 1 and "" not in node:
+        return branches[0]
+    group = "(?:" + "|".join(branches) + ")"
+    return group + "?" if "" in node else group
+
+
+class KeywordMatcher:
+    def __init__(self, keywords):
+        trie = {}
+        self.size = 0
+        for kw in keywords:
+            kw = normalize_keyword(kw)
+            if not kw:
+                continue
+            node = trie
+            for ch in kw:
+                node = node.setdefault(ch, {})
+            if "" not in node:
+                node[""] = True
+                self.size += 1
+        # no alphanumeric character directly before or after the keyword
+        self.regex = re.compile(r"(?<![^\W_])" + _trie_pattern(trie) + r"(?![^\W_])") if trie else None
+
+    def search(self, text):
+        """The first keyword found in text (as written there), or None."""
+        if self.regex is None or not text:
+            return None
+        m = self.regex.search(text.lower())
+        return m.group(0) if m else None
+
+
+class ChannelClassifier:
+    def __init__(self, keywords, known_hosts=(), host_stats=None):
+        weak = {normalize_keyword(kw) for kw in WEAK_KEYWORDS}
+        self.strong = KeywordMatcher(kw for kw in keywords if normalize_keyword(kw) not in weak)
+        self.weak = KeywordMatcher(weak)
+        self.known_hosts = {h.lower().lstrip(".") for h in known_hosts}
+        self.host_stats = host_stats or {}
+        self.hosts = {}  # host -> (score, rejected), filled on first sight
+
+    def keyword_score(self, text):
+        if self.strong.search(text):
+            return STRONG_WEIGHT
+        if self.weak.search(text):
+            return WEAK_WEIGHT
+        return 0.0
+
+    def _is_known(self, host):
+        # bnt.bg in the list covers cdn.bnt.bg as well
+        parts = host.split(".")
+        return any(".".join(parts[i:]) in self.known_hosts for i in range(len(parts) - 1))
+
+    def host_verdict(self, host):
+        """(score, rejected) for a stream host; rejected = only foreign channels seen there."""
+        verdict = self.hosts.get(host)
+        if verdict is None:
+            score = 0.0
+            if host.endswith(COUNTRY_TLDS):
+                score += TLD_SCORE
+            if self._is_known(host):
+                score += KNOWN_HOST_SCORE
+            bulgarian, total = self.host_stats.get(host, (0, 0))
+            if bulgarian:
+                score += LEARNED_HOST_SCORE
+            rejected = score == 0 and total >= MIN_HOST_SAMPLES
+            verdict = self.hosts[host] = (score, rejected)
+        return verdict
+
+    def score(self, ch):
+        score = self.host_verdict(host_of(ch.url))[0]
+        if not ch.has_meta:
+            return score + BARE_URL_WEIGHT * self.keyword_score(ch.url)
+        for field, weight in FIELD_WEIGHTS.items():
+            text = ch.url if field == "url" else getattr(ch, field)
+            if text:
+                score += weight * self.keyword_score(text)
+        if ch.tvg_id.lower().endswith(COUNTRY_TLDS):  # e.g. tvg-id="bTV.bg"
+            score += TLD_SCORE
+        return score
+
+    def is_bulgarian(self, ch):
+        return self.score(ch) >= THRESHOLD
+
+    def worth_testing(self, ch):
+        """
+        Cheap pre-filter for tester.py. A channel with metadata must already
+        pass; a bare link is only skipped when its host has never carried
+        anything Bulgarian, and even then a random REJECTED_SAMPLE of them is
+        tested, so the host's counts in bg_hosts.json keep being updated.
+        """
+        if ch.has_meta:
+            return self.is_bulgarian(ch)
+        return not self.host_verdict(host_of(ch.url))[1] or random.random() < REJECTED_SAMPLE
+
+
+CLASSIFIER = ChannelClassifier(
+    load_keywords() + EXTRA_KEYWORDS,
+    load_keywords(KNOWN_HOSTS_FILE),
+    load_host_stats(),
+)
+
+
+def is_bulgarian(ch):
+    return CLASSIFIER.is_bulgarian(ch)
+
+
+def worth_testing(ch):
+    return CLASSIFIER.worth_testing(ch)
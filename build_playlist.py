@@ -1,122 +1,90 @@
 #!/usr/bin/env python3
 # build_playlist.py
 # Reads bg_playlist_temp.m3u (tested working URLs)
-# Filters for Bulgarian channels using bg_channel_keywords.txt
+# Filters for Bulgarian channels (bg_classifier.py, keywords in bg_channel_keywords.txt)
 # Outputs bg_playlist.m3u (clean, deduplicated) and bg_playlist_unfiltered.m3u (all tested links)
 
 import re
 import os
+from urllib.parse import urlparse
+
+from bg_classifier import HOST_STATS_FILE, is_bulgarian, load_host_stats
+from channel import read_channels, write_channels
+from common import host_of, save_json
+from crawl_priority import YIELD_FILE, load_yield
 
 TEMP_FILE = "bg_playlist_temp.m3u"
 OUTPUT_FILE = "bg_playlist.m3u"
 UNFILTERED = "bg_playlist_unfiltered.m3u"
-KW_FILE = "bg_channel_keywords.txt"
-
-# Load Bulgarian keywords (lowercased)
-bg_keywords = []
-if os.path.exists(KW_FILE):
-    with open(KW_FILE, "r", encoding="utf8") as f:
-        for line in f:
-            w = line.strip()
-            if w:
-                bg_keywords.append(w.lower())
 
-def looks_bulgarian(meta, url):
-    """
-    Decide whether this channel is Bulgarian.
-    - meta: the EXTINF text (may be empty)
-    - url: the stream URL
-    """
-    text = (meta or "") + " " + (url or "")
-    text = text.lower()
-    # quick exact / substring match against keywords
-    for kw in bg_keywords:
-        # use word boundary or substring where appropriate
-        if kw in text:
-            return True
-    # heuristic: if the URL domain ends with .bg -> likely Bulgarian
-    try:
-        from urllib.parse import urlparse
-        host = urlparse(url).hostname or ""
-        if host.endswith(".bg"):
-            return True
-    except:
-        pass
-    return False
+def main():
+    # Read temp file
+    if not os.path.exists(TEMP_FILE):
+        print(f"{TEMP_FILE} not found. Nothing to do.")
+        return
 
-def parse_m3u_lines(lines):
-    """
-    Parse lines from a temp m3u which may contain #EXTINF lines and URLs
-    Return list of tuples: (meta, url)
-    """
-    out = []
-    meta = ""
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
-        if line.startswith("#EXTINF"):
-            meta = line
-            continue
-        if line.startswith("#"):
-            continue
-        # a URL line
-        url = line
-        out.append((meta, url))
-        meta = ""
-    return out
+    entries = list(read_channels(TEMP_FILE))
 
-# Read temp file
-if not os.path.exists(TEMP_FILE):
-    print(f"{TEMP_FILE} not found. Nothing to do.")
-    exit(0)
+    # Save unfiltered list (for manual inspection)
+    with open(UNFILTERED, "w", encoding="utf8") as f:
+        write_channels(f, entries, with_source=False)
 
-with open(TEMP_FILE, "r", encoding="utf8", errors="ignore") as f:
-    lines = [l.rstrip("\n") for l in f]
+    # Filter Bulgarian channels
+    final = []
+    seen = set()
+    host_stats = {}  # host -> [bulgarian, total] for this run
+    page_stats = {}  # page the stream was found on -> [bulgarian, total]
+    page_host_stats = {}
+    for ch in entries:
+        url = ch.url.strip()
+        if url in seen:
+            continue
+        # name, tvg-id, group-title, URL and host are all scored (bg_classifier.py)
+        bulgarian = is_bulgarian(ch)
+        counts = host_stats.setdefault(host_of(url), [0, 0])
+        counts[0] += bulgarian
+        counts[1] += 1
+        if ch.source:
+            for stats, key in ((page_stats, ch.source), (page_host_stats, host_of(ch.source))):
+                counts = stats.setdefault(key, [0, 0])
+                counts[0] += bulgarian
+                counts[1] += 1
+        if bulgarian:
+            # Derive name
+            name = ch.name
+            if not name:
+                # Derive from host
+                try:
+                    host = urlparse(url).hostname or url
+                    name = host
+                except:
+                    name = url
+            # Ensure name is simple
+            name = re.sub(r'[\r\n]+', '', name)
+            final.append(ch._replace(url=url, name=name))
+            seen.add(url)
 
-entries = parse_m3u_lines(lines)
+    # Write final playlist
+    with open(OUTPUT_FILE, "w", encoding="utf8") as f:
+        write_channels(f, final, with_source=False)
 
-# Save unfiltered list (for manual inspection)
-with open(UNFILTERED, "w", encoding="utf8") as f:
-    f.write("#EXTM3U\n")
-    for meta, url in entries:
-        if meta:
-            f.write(meta + "\n")
-        f.write(url + "\n")
+    # What each host carried feeds the next run's classifier (and tester's
+    # pre-filter); hosts not seen this time keep their old counts.
+    stats = load_host_stats()
+    stats.update(host_stats)
+    stats.pop("", None)
+    save_json(stats, HOST_STATS_FILE)
 
-# Filter Bulgarian channels
-final = []
-seen = set()
-for meta, url in entries:
-    url = url.strip()
-    meta_text = meta.strip() if meta else ""
-    if url in seen:
-        continue
-    if looks_bulgarian(meta_text, url):
-        # Derive name
-        name = None
-        # Try to extract human name from EXTINF
-        m = re.search(r'#EXTINF:[^\n,]*,(.+)$', meta_text)
-        if m:
-            name = m.group(1).strip()
-        if not name:
-            # Derive from host
-            try:
-                from urllib.parse import urlparse
-                host = urlparse(url).hostname or url
-                name = host
-            except:
-                name = url
-        # Ensure name is simple
-        name = re.sub(r'[\r\n]+', '', name)
-        final.append((name, url))
-        seen.add(url)
+    # Where the streams were found ranks the next crawl's frontier
+    # (crawl_priority.py); same merge rule.
+    crawl_yield = load_yield()
+    crawl_yield["pages"].update(page_stats)
+    crawl_yield["hosts"].update(page_host_stats)
+    crawl_yield["hosts"].pop("", None)
+    save_json(crawl_yield, YIELD_FILE)
 
-# Write final playlist
-with open(OUTPUT_FILE, "w", encoding="utf8") as f:
-    f.write("#EXTM3U\n")
-    for name, url in final:
-        f.write(f"#EXTINF:-1,{name}\n{url}\n")
+    print(f"Wrote {len(final)} Bulgarian channels to {OUTPUT_FILE}")
+    print(f"Unfiltered tested links saved to {UNFILTERED}")
 
-print(f"Wrote {len(final)} Bulgarian channels to {OUTPUT_FILE}")
-print(f"Unfiltered tested links saved to {UNFILTERED}")
+if __name__ == "__main__":
+    main()
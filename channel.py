@@ -0,0 +1,97 @@
+# channel.py
+# Compact record for one playlist entry.
+#
+# recursive_expander.py creates these from parsed #EXTINF lines, tester.py
+# carries them through validation and build_playlist.py / flatten_m3u.py
+# filter on them, so channel names and tvg-* attributes are never lost
+# between stages. Where a link came from travels with it as the non-standard
+# x-source EXTINF attribute; the published playlists are written without it.
+
+from collections import namedtuple
+
+from m3u_parser import format_extinf, iter_m3u
+
+SOURCE_ATTR = "x-source"
+KNOWN_ATTRS = ("tvg-id", "tvg-logo", "group-title")
+
+
+class Channel(namedtuple("Channel", "url name tvg_id tvg_logo group_title source extra")):
+    """
+    url, name, tvg_id, tvg_logo, group_title: the usual playlist fields
+    source: page or playlist the entry was found on ("" if unknown)
+    extra: any other EXTINF attributes, as a tuple of (key, value) pairs
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def bare(cls, url, source=""):
+        """A link with no metadata yet."""
+        return cls(url, "", "", "", "", source, ())
+
+    @classmethod
+    def from_entry(cls, attrs, url, source=""):
+        """Build from an (attrs, url) record of m3u_parser."""
+        attrs = dict(attrs)
+        attrs.pop("duration", None)
+        name = attrs.pop("name", "")
+        return cls(
+            url,
+            "" if name == "Unknown" else name,
+            attrs.pop("tvg-id", ""),
+            attrs.pop("tvg-logo", ""),
+            attrs.pop("group-title", ""),
+            attrs.pop(SOURCE_ATTR, "") or source,
+            tuple(attrs.items()),
+        )
+
+    @property
+    def has_meta(self):
+        return bool(self.name or self.tvg_id or self.group_title)
+
+    def merge(self, other):
+        """Fill empty fields from another record of the same URL."""
+        return self._replace(**{
+            f: getattr(other, f)
+            for f in ("name", "tvg_id", "tvg_logo", "group_title", "source", "extra")
+            if not getattr(self, f) and getattr(other, f)
+        })
+
+    def attrs(self, with_source=True):
+        out = {"duration": "-1"}
+        for key, value in zip(KNOWN_ATTRS, (self.tvg_id, self.tvg_logo, self.group_title)):
+            if value:
+                out[key] = value
+        out.update(self.extra)
+        if self.source and with_source:
+            out[SOURCE_ATTR] = self.source
+        out["name"] = self.name or "Unknown"
+        return out
+
+    def extinf(self, with_source=True):
+        return format_extinf(self.attrs(with_source))
+
+    def meta_text(self):
+        """Everything a keyword filter might look at, in one string."""
+        return " ".join((self.name, self.tvg_id, self.group_title))
+
+
+# -----------------------------
+# Reading / writing playlists of channels
+# -----------------------------
+
+def read_channels(path, source=""):
+    """Yield Channels from a local M3U file, streaming it in chunks."""
+    with open(path, "rb") as f:
+        for attrs, url in iter_m3u(iter(lambda: f.read(65536), b"")):
+            yield Channel.from_entry(attrs, url, source)
+
+
+def write_channels(f, channels, with_source=True):
+    """Write an M3U playlist; returns the number of entries written."""
+    f.write("#EXTM3U\n")
+    n = 0
+    for ch in channels:
+        f.write(f"{ch.extinf(with_source)}\n{ch.url}\n")
+        n += 1
+    return n
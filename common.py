@@ -0,0 +1,66 @@
+# common.py
+# Small pieces shared by the crawl stages: the host of a URL, atomic JSON
+# state files, and the base class of the SQLite-backed stores (frontier,
+# visit history, link store, HTTP cache index, health history, ...).
+
+import json
+import os
+import sqlite3
+from urllib.parse import urlsplit
+
+
+def host_of(url):
+    """Lower-cased host name of url ("" if it has none or does not parse)."""
+    try:
+        return (urlsplit(url).hostname or "").lower()
+    except ValueError:
+        return ""
+
+
+def save_json(data, path):
+    """Write data to path through a .part file, so readers never see half a file."""
+    with open(path + ".part", "w", encoding="utf8") as f:
+        json.dump(data, f, sort_keys=True, indent=0)
+    os.replace(path + ".part", path)
+
+
+class SQLiteStore:
+    """
+    One SQLite database file. Subclasses create their tables after calling
+    __init__ and call _wrote() after each write. Writes are committed every
+    `commit_every` of them and on close(), so a job killed mid-run keeps
+    everything up to the last flush.
+    """
+
+    commit_every = 200
+
+    def __init__(self, path, check_same_thread=True):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.created = not os.path.exists(path)  # no database file before this run
+        self.db = sqlite3.connect(path, check_same_thread=check_same_thread)
+        self.pending = 0
+
+    def columns(self, table):
+        """Names of table's columns (empty if it does not exist yet)."""
+        return {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}
+
+    def add_columns(self, table, columns):
+        """Add the {name: declaration} columns a table made by an older version lacks."""
+        have = self.columns(table)
+        for name, decl in columns.items():
+            if name not in have:
+                self.db.execute(f"ALTER TABLE {table} ADD COLUMN {name} {decl}")
+        self.db.commit()
+
+    def _wrote(self, n=1):
+        self.pending += n
+        if self.pending >= self.commit_every:
+            self.commit()
+
+    def commit(self):
+        self.db.commit()
+        self.pending = 0
+
+    def close(self):
+        self.commit()
+        self.db.close()
@@ -0,0 +1,108 @@
+# content_store.py
+# Content-addressed memory of fetched documents for recursive_expander.py.
+#
+# Many playlist URLs are mirrors of one file: iptv-org index variants,
+# raw.githubusercontent copies, pastes. Two hashes recognise them:
+#
+#   - the body hash (SHA-1 of the text) finds byte-identical copies of
+#     documents that are parsed whole (HTML, XML, text lists). Their
+#     extracted links are stored with it, so an identical body is never
+#     parsed twice. Playlists are parsed while they stream in, so only the
+#     second hash applies to them.
+#   - the link-set hash (SHA-1 of the sorted, normalised link URLs) finds
+#     copies that differ only in formatting, entry order, EXTINF metadata or
+#     tracking parameters. The URL that produced each set is kept with the
+#     expansion depth it was found at. Another URL producing the same set at
+#     that depth or deeper is a mirror: its nested playlists were already
+#     queued from the first copy, with at least as much depth left. A copy
+#     found shallower takes the set over, so its nested playlists get
+#     expanded to the full depth.
+#
+# Rows nobody has looked up for MAX_AGE are dropped on close().
+
+import hashlib
+import json
+import os
+import time
+
+from common import SQLiteStore
+from link_store import normalize_url
+
+CONTENT_DB = os.path.join(".cache", "content.db")
+MAX_AGE = 30 * 24 * 3600
+COMMIT_EVERY = 200
+
+
+def body_hash(data):
+    if isinstance(data, str):
+        data = data.encode()
+    return hashlib.sha1(data).hexdigest()
+
+def link_set_hash(links):
+    """Same value for link sets that only differ in order or URL spelling."""
+    canonical = sorted({normalize_url(link) or link for link in links})
+    return hashlib.sha1("\n".join(canonical).encode()).hexdigest()
+
+
+class ContentStore(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=CONTENT_DB):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS bodies ("
+            " hash TEXT PRIMARY KEY,"
+            " links TEXT NOT NULL,"
+            " used REAL NOT NULL) WITHOUT ROWID"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS link_sets ("
+            " hash TEXT PRIMARY KEY,"
+            " url TEXT NOT NULL,"
+            " used REAL NOT NULL) WITHOUT ROWID"
+        )
+        # rows of unknown depth count as top level, so their mirrors are still skipped
+        self.add_columns("link_sets", {"depth": "INTEGER NOT NULL DEFAULT 0"})
+        self.reused = 0   # bodies whose links came from the store
+        self.mirrors = 0  # documents whose link set another URL produced first
+
+    def links(self, body):
+        """Links extracted earlier from this body hash, or None."""
+        row = self.db.execute("SELECT links FROM bodies WHERE hash = ?", (body,)).fetchone()
+        if row is None:
+            return None
+        self.db.execute("UPDATE bodies SET used = ? WHERE hash = ?", (time.time(), body))
+        self._wrote()
+        self.reused += 1
+        return json.loads(row[0])
+
+    def add_body(self, body, links):
+        """Remember the links extracted from a body hash."""
+        self.db.execute(
+            "INSERT OR REPLACE INTO bodies (hash, links, used) VALUES (?, ?, ?)",
+            (body, json.dumps(sorted(links)), time.time()),
+        )
+        self._wrote()
+
+    def is_mirror(self, url, links, depth):
+        """True if another URL produced this link set at `depth` or shallower."""
+        key = link_set_hash(links)
+        now = time.time()
+        row = self.db.execute("SELECT url, depth FROM link_sets WHERE hash = ?", (key,)).fetchone()
+        mirror = row is not None and row[0] != url and row[1] <= depth
+        if mirror:
+            self.db.execute("UPDATE link_sets SET used = ? WHERE hash = ?", (now, key))
+            self.mirrors += 1
+        else:
+            self.db.execute(
+                "INSERT OR REPLACE INTO link_sets (hash, url, used, depth) VALUES (?, ?, ?, ?)",
+                (key, url, now, depth),
+            )
+        self._wrote()
+        return mirror
+
+    def close(self):
+        cutoff = time.time() - MAX_AGE
+        self.db.execute("DELETE FROM bodies WHERE used < ?", (cutoff,))
+        self.db.execute("DELETE FROM link_sets WHERE used < ?", (cutoff,))
+        super().close()
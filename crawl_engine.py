@@ -0,0 +1,150 @@
+# crawl_engine.py
+# asyncio/aiohttp crawl loop with per-host politeness.
+#
+# A fixed pool of workers pulls URLs from a Frontier. The global concurrency
+# limit is the worker count (and the connector limit), each host gets at most
+# `per_host` open connections, and consecutive requests to the same host are
+# spaced by `host_delay` seconds. URLs whose host is already saturated are
+# parked in memory and picked up again once that host frees up, so one busy
+# host never stalls workers that could be fetching from somewhere else.
+
+import asyncio
+import ssl
+from collections import defaultdict, deque
+import aiohttp
+
+from common import host_of
+
+MAX_DEFERRED = 5000  # URLs parked for busy hosts before workers start waiting on them
+
+
+class HostLimiter:
+    """Per-host connection cap plus a minimum delay between request starts."""
+
+    def __init__(self, per_host=2, delay=1.0):
+        self.per_host = per_host
+        self.delay = delay
+        self.active = {}  # host -> callers holding or waiting for a slot
+        self.slots = {}   # host -> asyncio.Semaphore(per_host), dropped when idle
+        self.next_start = defaultdict(float)
+
+    def busy(self, host):
+        return self.active.get(host, 0) >= self.per_host
+
+    async def acquire(self, host):
+        loop = asyncio.get_running_loop()
+        self.active[host] = self.active.get(host, 0) + 1
+        slots = self.slots.get(host)
+        if slots is None:
+            slots = self.slots[host] = asyncio.Semaphore(self.per_host)
+        try:
+            await slots.acquire()
+        except BaseException:
+            self._leave(host)
+            raise
+        # reserve the next start slot before sleeping so concurrent callers queue up behind us
+        now = loop.time()
+        start = max(now, self.next_start[host])
+        self.next_start[host] = start + self.delay
+        if start > now:
+            try:
+                await asyncio.sleep(start - now)
+            except BaseException:
+                self.release(host)
+                raise
+
+    def release(self, host):
+        self.slots[host].release()
+        self._leave(host)
+
+    def _leave(self, host):
+        self.active[host] -= 1
+        if not self.active[host]:
+            del self.active[host]
+            del self.slots[host]
+
+
+class AsyncCrawler:
+    """
+    Drive `handle(session, url)` over a frontier.
+
+    - should_fetch(url): cheap synchronous filter (visited, scheme, ...)
+    - handle(session, url): coroutine doing the fetch; returns True when the
+      URL counts towards max_pages
+    """
+
+    def __init__(self, frontier, should_fetch, handle, max_pages,
+                 concurrency=20, per_host=2, host_delay=1.0, timeout=10):
+        self.frontier = frontier
+        self.should_fetch = should_fetch
+        self.handle = handle
+        self.max_pages = max_pages
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.hosts = HostLimiter(per_host, host_delay)
+        self.deferred = defaultdict(deque)
+        self.n_deferred = 0
+        self.in_flight = 0
+        self.pages = 0
+
+    def _take_deferred(self):
+        for host, urls in self.deferred.items():
+            if not self.hosts.busy(host):
+                url = urls.popleft()
+                if not urls:
+                    del self.deferred[host]
+                self.n_deferred -= 1
+                return url
+        return None
+
+    def _next_url(self):
+        url = self._take_deferred()
+        if url is not None:
+            return url
+        while True:
+            url = self.frontier.pop()
+            if url is None:
+                return None
+            if not self.should_fetch(url):
+                continue
+            host = host_of(url)
+            if self.hosts.busy(host) and self.n_deferred < MAX_DEFERRED:
+                self.deferred[host].append(url)
+                self.n_deferred += 1
+                continue
+            return url
+
+    async def _worker(self, session):
+        while self.pages < self.max_pages:
+            url = self._next_url()
+            if url is None:
+                if self.in_flight == 0 and not self.deferred:
+                    return
+                await asyncio.sleep(0.1)
+                continue
+            host = host_of(url)
+            self.in_flight += 1
+            await self.hosts.acquire(host)
+            try:
+                if await self.handle(session, url):
+                    self.pages += 1
+            except Exception as e:
+                print(f"Crawl error on {url}: {e}")
+            finally:
+                self.hosts.release(host)
+                self.in_flight -= 1
+
+    async def run(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            limit_per_host=self.hosts.per_host,
+            ssl=ssl.create_default_context(),
+        )
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            await asyncio.gather(*(self._worker(session) for _ in range(self.concurrency)))
+        # anything still parked goes back to the frontier for the next run
+        for urls in self.deferred.values():
+            self.frontier.extend(urls)
+        self.deferred.clear()
+        return self.pages
@@ -0,0 +1,160 @@
+# crawl_priority.py
+# Scores crawl-frontier URLs by how likely they are to lead to Bulgarian
+# streams, so crawler.py spends its page budget on the best ones first.
+#
+# A URL's score adds up two kinds of evidence:
+#
+#   - URL features: the extension (.m3u/.m3u8 far above pages, images and
+#     scripts far below), playlist-ish path keywords, raw-file hosts
+#     (raw.githubusercontent, pastebin raw, telegra.ph), the .bg TLD, and
+#     penalties for search-engine result pages, social sites and GitHub
+#     site chrome.
+#   - history: YIELD_FILE (written by build_playlist.py) counts, per page a
+#     stream was found on and per host of that page, how many tested streams
+#     were Bulgarian. A page or host that yielded scores higher, and so do
+#     the links found on it (the referrer). One that was sampled often and
+#     never yielded scores lower. Hosts serving Bulgarian streams themselves
+#     (bg_hosts.json) get a small bonus.
+#
+# Host scores are computed once per host and cached.
+
+import json
+import math
+from urllib.parse import urlsplit
+
+from bg_classifier import HOST_STATS_FILE, load_host_stats
+from common import host_of
+
+YIELD_FILE = "crawl_yield.json"  # {"pages": {url: [bulgarian, total]}, "hosts": {host: [...]}}
+
+PLAYLIST_SCORE = 6
+LIST_SCORE = 1
+SKIP_SCORE = -10     # images, scripts, archives: below anything a good host earns
+KEYWORD_SCORE = 1      # per path keyword, up to MAX_KEYWORDS
+MAX_KEYWORDS = 3
+RAW_HOST_SCORE = 2
+TLD_SCORE = 1
+SEARCH_SCORE = -4
+CHROME_SCORE = -3
+LONG_URL_SCORE = -1
+STREAM_HOST_SCORE = 1
+YIELD_WEIGHT = 2       # per doubling of the Bulgarian streams a page/host yielded
+BARREN_SCORE = -2      # sampled MIN_SAMPLES times, nothing Bulgarian
+MIN_SAMPLES = 5
+REFERRER_WEIGHT = 0.5  # share of the referrer's history passed on to its links
+
+PLAYLIST_EXT = (".m3u", ".m3u8")
+LIST_EXT = (".txt", ".json", ".xml")
+SKIP_EXT = (
+    ".png", ".jpg", ".jpeg", ".gif", ".svg", ".webp", ".ico", ".css", ".js",
+    ".woff", ".woff2", ".ttf", ".pdf", ".zip", ".rar", ".7z", ".gz", ".exe",
+    ".apk", ".mp4", ".mp3", ".mkv", ".avi",
+)
+PATH_KEYWORDS = (
+    "iptv", "m3u", "playlist", "stream", "channel", "kanal", "live", "tv",
+    "bg", "bulgar", "българ", "тв", "канал",
+)
+RAW_HOSTS = ("raw.githubusercontent.com", "gist.githubusercontent.com", "telegra.ph")
+SEARCH_HOSTS = ("google.", "bing.com", "duckduckgo.com", "yandex.", "yahoo.", "qwant.com", "mojeek.com")
+SOCIAL_HOSTS = (
+    "facebook.com", "twitter.com", "x.com", "instagram.com", "linkedin.com",
+    "youtube.com", "tiktok.com", "pinterest.com", "t.co",
+)
+# first path segment of github.com pages that are never repositories
+GITHUB_CHROME = {
+    "", "about", "features", "pricing", "login", "signup", "join", "explore",
+    "topics", "trending", "collections", "marketplace", "sponsors", "settings",
+    "site", "security", "enterprise", "customer-stories", "readme", "solutions",
+    "resources", "team", "contact", "orgs", "apps", "notifications", "search",
+}
+
+
+def load_yield(path=YIELD_FILE):
+    try:
+        with open(path, "r", encoding="utf8") as f:
+            data = json.load(f)
+    except (FileNotFoundError, ValueError):
+        data = {}
+    return {"pages": data.get("pages", {}), "hosts": data.get("hosts", {})}
+
+
+def yield_score(counts):
+    bulgarian, total = counts
+    if bulgarian:
+        return YIELD_WEIGHT * math.log2(1 + bulgarian)
+    if total >= MIN_SAMPLES:
+        return BARREN_SCORE
+    return 0.0
+
+
+def _host_matches(host, names):
+    return any(host == name or host.endswith("." + name) for name in names)
+
+
+class CrawlPriority:
+    def __init__(self, yield_stats=None, stream_hosts=None):
+        stats = yield_stats if yield_stats is not None else {"pages": {}, "hosts": {}}
+        self.pages = stats["pages"]
+        self.page_hosts = stats["hosts"]
+        self.stream_hosts = stream_hosts or {}
+        self.hosts = {}  # host -> score, filled on first sight
+
+    def host_score(self, host):
+        score = self.hosts.get(host)
+        if score is None:
+            score = 0.0
+            if _host_matches(host, RAW_HOSTS):
+                score += RAW_HOST_SCORE
+            if host.endswith(".bg"):
+                score += TLD_SCORE
+            if any(name in host for name in SEARCH_HOSTS):
+                score += SEARCH_SCORE
+            if _host_matches(host, SOCIAL_HOSTS):
+                score += CHROME_SCORE
+            if self.stream_hosts.get(host, (0, 0))[0]:
+                score += STREAM_HOST_SCORE
+            score += yield_score(self.page_hosts.get(host, (0, 0)))
+            self.hosts[host] = score
+        return score
+
+    def url_score(self, url):
+        """Score from the URL alone, plus what its host and the page itself yielded."""
+        try:
+            parts = urlsplit(url)
+            host = (parts.hostname or "").lower()
+        except ValueError:
+            return SKIP_SCORE
+        path = parts.path.lower()
+        score = self.host_score(host)
+        if path.endswith(PLAYLIST_EXT):
+            score += PLAYLIST_SCORE
+        elif path.endswith(LIST_EXT):
+            score += LIST_SCORE
+        elif path.endswith(SKIP_EXT):
+            score += SKIP_SCORE
+        if host == "pastebin.com" and path.startswith("/raw/"):
+            score += RAW_HOST_SCORE
+        if host == "github.com" and path.strip("/").split("/")[0] in GITHUB_CHROME:
+            score += CHROME_SCORE
+        text = path + "?" + parts.query.lower()
+        score += KEYWORD_SCORE * min(MAX_KEYWORDS, sum(kw in text for kw in PATH_KEYWORDS))
+        if len(url) > 200:
+            score += LONG_URL_SCORE
+        return score + yield_score(self.pages.get(url, (0, 0)))
+
+    def referrer_score(self, referrer):
+        """What the page a link was found on passes on to it."""
+        host = host_of(referrer)
+        learned = yield_score(self.pages.get(referrer, (0, 0))) + yield_score(self.page_hosts.get(host, (0, 0)))
+        return REFERRER_WEIGHT * learned
+
+    def score(self, url, referrer=None):
+        score = self.url_score(url)
+        if referrer:
+            score += self.referrer_score(referrer)
+        return round(score, 2)
+
+
+def load_priority():
+    """A CrawlPriority primed with everything earlier runs learned."""
+    return CrawlPriority(load_yield(), load_host_stats(HOST_STATS_FILE))
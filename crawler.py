@@ -1,152 +1,261 @@
-import requests
-from bs4 import BeautifulSoup
-import json
-import re
 import time
-from urllib.parse import urljoin, urlparse
+import asyncio
+import hashlib
+from urllib.parse import urlparse
+
+from channel import Channel
+from crawl_engine import AsyncCrawler
+from crawl_priority import load_priority
+from frontier import Frontier
+from http_cache import HTTPCache
+from link_extractor import extract_links, find_streams
+from link_store import LinkStore
+from m3u_parser import iter_m3u
+from robots_cache import RobotsCache
+from visited_store import VisitedStore
 
 MAX_PAGES_PER_RUN = 50
+# Async mode: many pages in flight at once, politeness enforced per host
+# instead of a global sleep, so the page budget can be much larger.
+ASYNC_MODE = True
+ASYNC_MAX_PAGES_PER_RUN = 5000
+CONCURRENCY = 32          # global in-flight requests
+PER_HOST_CONNECTIONS = 2  # open connections to any single host
+PER_HOST_DELAY = 1.0      # seconds between request starts on the same host
+REVISIT_SHARE = 0.5       # at most this share of the page budget goes to revisits
+MAX_BODY_SIZE = 5_000_000
+RESPECT_ROBOTS = True     # skip pages robots.txt disallows (robots_cache.py)
 SEEDS_FILE = "seeds.txt"
-QUEUE_FILE = "queue.json"
-VISITED_FILE = "visited.json"
-FOUND_FILE = "found_links.txt"
-KEYWORDS_FILE = "keywords.txt"
+FRONTIER_DB = "frontier.db"
+VISITED_DB = "visited.db"
+LEGACY_VISITED_FILE = "visited.json"
+LINKS_DB = "links.db"
+
+# pipeline.py --stream sets this to an async callable taking a Channel; every
+# new stream link is handed to it as it is found (it waits when tester falls behind)
+stream_sink = None
 
 # -----------------------------
-# LOAD VISITED PAGES
+# CLASSIFY A RESPONSE BY ITS HEADERS
 # -----------------------------
-try:
-    with open(VISITED_FILE, "r") as f:
-        visited = json.load(f)
-except FileNotFoundError:
-    visited = {}
+def page_kind(url, content_type):
+    """
+    Decide what to do with a response before reading its body.
+    Returns "html", "playlist", "text" or None (skip, body is never downloaded).
+    """
+    ct = content_type.lower()
+    if "text/html" in ct or "xhtml" in ct:
+        return "html"
+    if "mpegurl" in ct:
+        return "playlist"
+    path = urlparse(url).path.lower()
+    if path.endswith((".m3u", ".m3u8")) and ("text/" in ct or "octet-stream" in ct):
+        return "playlist"
+    if ct.startswith("text/"):
+        return "text"
+    return None
 
 # -----------------------------
-# LOAD QUEUE
+# PARSE LINKS OUT OF AN HTML PAGE
 # -----------------------------
-try:
-    with open(QUEUE_FILE, "r") as f:
-        queue = json.load(f)
-except FileNotFoundError:
-    queue = []
+def parse_links(url, html):
+    # anchor hrefs and raw .m3u / .m3u8 URLs, in one pass (link_extractor.py)
+    return extract_links(url, html)
 
 # -----------------------------
-# LOAD KEYWORDS FOR AUTO-EXPANDING SEARCH
+# STREAM URLS INSIDE A PLAYLIST
 # -----------------------------
-EXTRA_KEYWORDS = []
-try:
-    with open(KEYWORDS_FILE, "r", encoding="utf8") as f:
-        EXTRA_KEYWORDS = [x.strip() for x in f if x.strip()]
-except FileNotFoundError:
-    EXTRA_KEYWORDS = []
+def parse_playlist(url, body):
+    # An HLS master/media playlist is itself a stream; anything else is an
+    # IPTV list whose entries are the streams. The list itself is stored as
+    # well, so recursive_expander.py reads it again with its EXTINF metadata
+    # (channel names, tvg-id), which the link store does not keep.
+    if "#EXT-X-STREAM-INF" in body or "#EXT-X-TARGETDURATION" in body:
+        return [url]
+    entries = iter_m3u([body.encode("utf-8")], base_url=url)
+    return [url] + [link for _, link in entries if link.startswith("http")]
+
+def parse_body(url, kind, body):
+    """Route a downloaded body to the right extractor -> (page links, stream links)."""
+    if kind == "html":
+        return parse_links(url, body)
+    if kind == "playlist":
+        return [], parse_playlist(url, body)
+    return [], find_streams(body)
 
 # -----------------------------
-# IF QUEUE IS EMPTY → LOAD SEEDS
+# FETCH PAGE (single streaming GET)
 # -----------------------------
-if not queue:
-    with open(SEEDS_FILE, "r") as f:
-        queue = [line.strip() for line in f if line.strip()]
+def fetch(url):
+    """Returns (kind, body); kind is None when the URL is skipped."""
+    content_type, data = cache.get(
+        url, timeout=10, max_size=MAX_BODY_SIZE,
+        accept=lambda ct: page_kind(url, ct) is not None,
+    )
+    if data is None:
+        return None, ""
+    return page_kind(url, content_type), data.decode("utf-8", errors="ignore")
 
 # -----------------------------
-# EXTEND QUEUE WITH SEARCH QUERIES (NEW)
+# RECORD RESULTS OF ONE PAGE
 # -----------------------------
-search_queries = [
-    "bg iptv playlist",
-    "bulgaria m3u",
-    "бг m3u8",
-    "българска телевизия онлайн"
-]
+def record_page(url, new_links, new_m3u):
+    """Queue the page links, store the stream links; returns the streams not seen before."""
+    global new_found
 
-# Add dynamic keywords to search queries
-for kw in EXTRA_KEYWORDS:
-    search_queries.append(f"{kw} iptv")
-    search_queries.append(f"{kw} m3u")
-    search_queries.append(f"{kw} m3u8")
-    search_queries.append(f"{kw} bg tv")
-    search_queries.append(f"{kw} бг тв")
-    search_queries.append(f"{kw} бг телевизия")
+    # Add new normal links into queue
+    for link in new_links:
+        if visited.is_due(link):
+            queue.push(link, referrer=url)
 
-# Convert all queries → Google search URLs
-for query in search_queries:
-    google_url = f"https://www.google.com/search?q={query.replace(' ', '+')}"
-    if google_url not in queue and google_url not in visited:
-        queue.append(google_url)
+    # Add found m3u links
+    found_links.extend(new_m3u)
+    fresh = [link for link in new_m3u if links.add(link, source=url)]
+    new_found += len(fresh)
 
-found_links = []
+    # Mark visited; the digest of the streams found drives the revisit interval
+    digest = hashlib.sha1("\n".join(sorted(set(new_m3u))).encode()).hexdigest()[:16]
+    visited.record(url, digest)
+    return fresh
+
+def should_fetch(url):
+    return url.startswith("http") and visited.is_due(url)
 
 # -----------------------------
-# CHECK IF URL IS HTML
+# SEQUENTIAL CRAWLING LOOP
 # -----------------------------
-def is_html(url):
-    try:
-        r = requests.head(url, timeout=5, allow_redirects=True)
-        content_type = r.headers.get("Content-Type","").lower()
-        return "text/html" in content_type
-    except:
-        return False
+def crawl_sync():
+    pages_crawled = 0
+    while queue and pages_crawled < MAX_PAGES_PER_RUN:
+        current_url = queue.pop()
+
+        if not should_fetch(current_url):
+            continue
+        kind, body = fetch(current_url)
+        if kind is None:
+            visited.record(current_url, ok=False)
+            continue
+
+        new_links, new_m3u = parse_body(current_url, kind, body)
+        record_page(current_url, new_links, new_m3u)
+        pages_crawled += 1
+        time.sleep(1)
+    return pages_crawled
 
 # -----------------------------
-# EXTRACT LINKS FROM PAGE
+# ASYNC CRAWLING LOOP
 # -----------------------------
-def extract_links(url):
-    links = []
-    m3u_links = []
-    try:
-        r = requests.get(url, timeout=10)
-        r.raise_for_status()
-        html = r.text
-        soup = BeautifulSoup(html, "html.parser")
-        # Anchor hrefs
-        for a in soup.find_all("a", href=True):
-            link = urljoin(url, a['href'])
-            links.append(link)
-        # Raw .m3u / .m3u8 URLs in text
-        m3u_links += re.findall(r'(https?://[^\s\'"<>]+\.m3u8?)', html)
-    except:
-        return [], []
-    return links, m3u_links
+async def fetch_page(session, url):
+    # visited may have changed while this URL was parked behind a busy host
+    if not visited.is_due(url):
+        return False
+    if RESPECT_ROBOTS and not await robots.allowed(session, url):
+        visited.record(url, ok=False)  # backs off like a failure; asked again later
+        return False
+    content_type, data = await cache.get_async(
+        session, url, max_size=MAX_BODY_SIZE,
+        accept=lambda ct: page_kind(url, ct) is not None,
+    )
+    if data is None:
+        visited.record(url, ok=False)
+        return False
+    kind = page_kind(url, content_type)
+    body = data.decode("utf-8", errors="ignore")
+    # parsing is CPU-bound; keep it off the event loop
+    new_links, new_m3u = await asyncio.to_thread(parse_body, url, kind, body)
+    fresh = record_page(url, new_links, new_m3u)
+    if stream_sink is not None:
+        for link in fresh:
+            await stream_sink(Channel.bare(link, source=url))
+    return True
+
+def make_crawler():
+    return AsyncCrawler(
+        queue, should_fetch, fetch_page,
+        max_pages=ASYNC_MAX_PAGES_PER_RUN,
+        concurrency=CONCURRENCY,
+        per_host=PER_HOST_CONNECTIONS,
+        host_delay=PER_HOST_DELAY,
+    )
+
+def crawl_async():
+    return asyncio.run(make_crawler().run())
 
 # -----------------------------
-# MAIN CRAWLING LOOP
+# MAIN
 # -----------------------------
-pages_crawled = 0
-while queue and pages_crawled < MAX_PAGES_PER_RUN:
-    current_url = queue.pop(0)
+def prepare(frontier=None, link_store=None, http_cache=None):
+    """Open the stores (pass shared ones in) and seed the frontier."""
+    global visited, queue, cache, found_links, links, new_found, robots, own
+    own = []
 
-    if current_url in visited:
-        continue
-    if not current_url.startswith("http"):
-        continue
-    if not is_html(current_url):
-        visited[current_url] = time.time()
-        continue
+    # -----------------------------
+    # OPEN VISITED PAGES (migrates visited.json on first run)
+    # -----------------------------
+    visited = VisitedStore(VISITED_DB, LEGACY_VISITED_FILE)
+    own.append(visited)
 
-    new_links, new_m3u = extract_links(current_url)
+    # -----------------------------
+    # OPEN FRONTIER (migrates queue.json on first run)
+    # -----------------------------
+    queue = frontier if frontier is not None else Frontier(FRONTIER_DB)
 
-    # Add new normal links into queue
-    for link in new_links:
-        if link not in visited and link not in queue:
-            queue.append(link)
+    # -----------------------------
+    # RANK THE FRONTIER BY PREDICTED YIELD (crawl_priority.py)
+    # -----------------------------
+    queue.scorer = load_priority().score
+    print(f"Ranked {queue.rescore()} queued URLs.")
 
-    # Add found m3u links
-    found_links.extend(new_m3u)
+    # -----------------------------
+    # IF QUEUE IS EMPTY → LOAD SEEDS
+    # -----------------------------
+    if not queue:
+        with open(SEEDS_FILE, "r") as f:
+            queue.extend(line.strip() for line in f if line.strip())
 
-    # Mark visited
-    visited[current_url] = time.time()
-    pages_crawled += 1
-    time.sleep(1)
+    # search queries built from keywords.txt are run by search_crawler.py
+    # (search_discovery.py), not queued here as search-engine pages
 
-# -----------------------------
-# SAVE UPDATED DATA
-# -----------------------------
-with open(VISITED_FILE, "w") as f:
-    json.dump(visited, f, indent=2)
+    # -----------------------------
+    # SCHEDULE REVISITS THAT HAVE COME DUE
+    # -----------------------------
+    page_budget = ASYNC_MAX_PAGES_PER_RUN if ASYNC_MODE else MAX_PAGES_PER_RUN
+    revisits = visited.due(int(page_budget * REVISIT_SHARE))
+    # due() is best-first; push in reverse so the best ends up at the head
+    for url in reversed(revisits):
+        queue.push_front(url)
+    print(f"Scheduled {len(revisits)} revisits.")
+
+    # validators + bodies of earlier responses, for conditional GETs
+    cache = http_cache if http_cache is not None else HTTPCache()
+    robots = RobotsCache()
+
+    found_links = []
+    # deduplicated link store (migrates found_links.txt on first run); committed
+    # as links are found, so a killed run keeps what it discovered
+    links = link_store if link_store is not None else LinkStore(LINKS_DB)
+    new_found = 0
+    own += [store for store, shared in ((queue, frontier), (cache, http_cache), (links, link_store)) if shared is None]
+
+def finish(pages_crawled):
+    # -----------------------------
+    # SAVE UPDATED DATA
+    # -----------------------------
+    # stores passed in by the caller are only committed; the caller closes them
+    for store in (links, visited, queue, cache):
+        if store in own:
+            store.close()
+        else:
+            store.commit()
+    robots.close()
 
-with open(QUEUE_FILE, "w") as f:
-    json.dump(queue, f, indent=2)
+    print(f"Crawled {pages_crawled} pages, found {len(found_links)} potential links ({new_found} new).")
+    print(f"HTTP cache: {cache.hits} not modified, {cache.misses} downloaded.")
 
-with open(FOUND_FILE, "a") as f:
-    for link in found_links:
-        f.write(link + "\n")
+def main(frontier=None):
+    """One crawl run; pass `frontier` to share an open one."""
+    prepare(frontier)
+    finish(crawl_async() if ASYNC_MODE else crawl_sync())
 
-print(f"Crawled {pages_crawled} pages, found {len(found_links)} potential links.")
+if __name__ == "__main__":
+    main()
@@ -4,25 +4,29 @@ import os
 INFILE = "keywords.txt"
 TMP = "keywords_clean.txt"
 
-if not os.path.exists(INFILE):
-    print("No keywords.txt found.")
-    exit(0)
+def main():
+    if not os.path.exists(INFILE):
+        print("No keywords.txt found.")
+        return
 
-seen = set()
-out = []
-with open(INFILE, "r", encoding="utf8") as f:
-    for line in f:
-        w = line.strip().lower()
-        if not w: 
-            continue
-        if w not in seen:
-            seen.add(w)
-            out.append(w)
+    seen = set()
+    out = []
+    with open(INFILE, "r", encoding="utf8") as f:
+        for line in f:
+            w = line.strip().lower()
+            if not w: 
+                continue
+            if w not in seen:
+                seen.add(w)
+                out.append(w)
 
-with open(TMP, "w", encoding="utf8") as f:
-    for w in sorted(out):
-        f.write(w + "\n")
+    with open(TMP, "w", encoding="utf8") as f:
+        for w in sorted(out):
+            f.write(w + "\n")
 
-# replace file
-os.replace(TMP, INFILE)
-print(f"Dedupe done, {len(out)} unique keywords.")
+    # replace file
+    os.replace(TMP, INFILE)
+    print(f"Dedupe done, {len(out)} unique keywords.")
+
+if __name__ == "__main__":
+    main()
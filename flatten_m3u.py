@@ -1,71 +1,142 @@
-import requests
-import re
-from urllib.parse import urljoin
+# flatten_m3u.py
+# Expands the group playlists referenced by bg_playlist.m3u into their
+# channels and writes bg_playlist_final.m3u.
+#
+# Group playlists are fetched concurrently (at most GROUP_WORKERS at once, on
+# one shared aiohttp session) and parsed as their bodies stream in. Every
+# expanded group is also kept under GROUP_CACHE_DIR: a group expanded less
+# than GROUP_TTL ago is read from there without any request, an older one is
+# revalidated through the HTTP cache (a 304 replays the stored body), and a
+# group that fails to fetch falls back to its last expansion.
+
+import asyncio
+import hashlib
+import os
+import time
+
+import aiohttp
+
+from bg_classifier import is_bulgarian
+from channel import Channel, read_channels, write_channels
+from http_cache import HTTPCache
+from m3u_parser import aiter_m3u, iter_m3u
 
 INPUT_FILE = "bg_playlist.m3u"
 OUTPUT_FILE = "bg_playlist_final.m3u"
 
-# Keywords to detect Bulgarian channels (optional)
-BG_KEYWORDS = [
-    "bnt","nova","btv","diema","bg","bul","bulgaria","канал","sofia"
-]
-
-def is_bulgarian(name, url):
-    text = (name + url).lower()
-    for kw in BG_KEYWORDS:
-        if kw in text:
-            return True
-    return False
-
-channels = []
-
-with open(INPUT_FILE, "r") as f:
-    lines = [line.strip() for line in f if line.strip()]
-
-i = 0
-while i < len(lines):
-    line = lines[i]
-    if line.startswith("#EXTINF"):
-        # save metadata line
-        meta = line
-        i += 1
-        url = lines[i] if i < len(lines) else None
-        if url:
-            channels.append((meta, url))
-    elif line.startswith("http"):
-        # This is likely a group playlist
-        url = line
+GROUP_WORKERS = 16
+GROUP_TIMEOUT = 30  # seconds per group playlist, whole download
+GROUP_CACHE_DIR = os.path.join(".cache", "groups")
+GROUP_TTL = 12 * 3600
+
+cache = None  # opened by main()
+
+# -----------------------------
+# Expanded-group cache
+# -----------------------------
+
+def group_path(url):
+    return os.path.join(GROUP_CACHE_DIR, hashlib.sha1(url.encode()).hexdigest() + ".m3u")
+
+def group_age(url):
+    try:
+        return time.time() - os.path.getmtime(group_path(url))
+    except OSError:
+        return None
+
+def read_group(url):
+    return list(read_channels(group_path(url), source=url))
+
+def save_group(url, group):
+    # every entry is kept, so a classifier change applies without refetching
+    path = group_path(url)
+    with open(path + ".part", "w", encoding="utf8") as f:
+        write_channels(f, group)
+    os.replace(path + ".part", path)
+
+# -----------------------------
+# Fetching
+# -----------------------------
+
+async def fetch_group(session, url):
+    """Channels of one group playlist, or None if it could not be fetched."""
+    group = []
+    fetched = False
+    async for attrs, inner_url in aiter_m3u(cache.iter_body_async(session, url), url):
+        fetched = True
+        if attrs:
+            group.append(Channel.from_entry(attrs, inner_url, source=url))
+    return group if fetched else None
+
+async def expand_group(session, sem, url):
+    age = group_age(url)
+    if age is not None and age < GROUP_TTL:
+        return read_group(url), "cached"
+    async with sem:
         try:
-            r = requests.get(url, timeout=10)
-            r.raise_for_status()
-            m3u_lines = [l.strip() for l in r.text.splitlines() if l.strip()]
-            j = 0
-            while j < len(m3u_lines):
-                l = m3u_lines[j]
-                if l.startswith("#EXTINF"):
-                    meta_inner = l
-                    j += 1
-                    if j < len(m3u_lines):
-                        url_inner = m3u_lines[j]
-                        if is_bulgarian(meta_inner, url_inner):
-                            channels.append((meta_inner, url_inner))
-                j += 1
-        except:
+            group = await asyncio.wait_for(fetch_group(session, url), GROUP_TIMEOUT)
+        except Exception:
+            group = None
+    if group is not None:
+        save_group(url, group)
+        return group, "fetched"
+    if age is not None:
+        return read_group(url), "stale"
+    return None, "failed"
+
+async def expand_groups(urls):
+    os.makedirs(GROUP_CACHE_DIR, exist_ok=True)
+    sem = asyncio.Semaphore(GROUP_WORKERS)
+    conn = aiohttp.TCPConnector(limit=GROUP_WORKERS)
+    async with aiohttp.ClientSession(connector=conn) as session:
+        return await asyncio.gather(*(expand_group(session, sem, url) for url in urls))
+
+# -----------------------------
+# Flatten
+# -----------------------------
+
+def main():
+    global cache
+    cache = HTTPCache()
+
+    channels = []
+    group_urls = []
+
+    with open(INPUT_FILE, "rb") as f:
+        for attrs, url in iter_m3u(f):
+            if attrs:
+                # a channel with its EXTINF metadata
+                channels.append(Channel.from_entry(attrs, url))
+            elif url.startswith("http"):
+                # This is likely a group playlist
+                group_urls.append(url)
+
+    group_urls = list(dict.fromkeys(group_urls))
+    results = asyncio.run(expand_groups(group_urls))
+    cache.close()
+
+    outcomes = {}
+    for url, (group, outcome) in zip(group_urls, results):
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+        if group is None:
             print(f"Failed to fetch {url}")
-    i += 1
-
-# Remove duplicates
-seen_urls = set()
-final_channels = []
-for meta, url in channels:
-    if url not in seen_urls:
-        final_channels.append((meta, url))
-        seen_urls.add(url)
-
-# Write final playlist
-with open(OUTPUT_FILE, "w") as f:
-    f.write("#EXTM3U\n")
-    for meta, url in final_channels:
-        f.write(f"{meta}\n{url}\n")
-
-print(f"Flattened playlist created: {OUTPUT_FILE}, total channels: {len(final_channels)}")
+            continue
+        channels.extend(ch for ch in group if is_bulgarian(ch))
+
+    # Remove duplicates
+    seen_urls = set()
+    final_channels = []
+    for ch in channels:
+        if ch.url not in seen_urls:
+            final_channels.append(ch)
+            seen_urls.add(ch.url)
+
+    # Write final playlist
+    with open(OUTPUT_FILE, "w", encoding="utf8") as f:
+        write_channels(f, final_channels, with_source=False)
+
+    print(f"Groups: {len(group_urls)} ({', '.join(f'{n} {k}' for k, n in sorted(outcomes.items())) or 'none'})")
+    print(f"Flattened playlist created: {OUTPUT_FILE}, total channels: {len(final_channels)}")
+
+if __name__ == "__main__":
+    main()
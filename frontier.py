@@ -0,0 +1,160 @@
+# frontier.py
+# Persistent crawl frontier shared by crawler.py, repo_scanner.py,
+# search_crawler.py and search_engine_scraper.py.
+#
+# The frontier lives in a small SQLite file instead of queue.json. The url
+# column is UNIQUE, so "is this link already queued?" is an index lookup
+# rather than a scan over a 60k-entry list, and pop() only reads the head
+# row, so a run never has to load or re-serialise the whole frontier.
+#
+# The head is the URL with the highest priority (oldest first among equals),
+# read off an index. Priorities come from `scorer(url, referrer)` when one is
+# set (crawler.py sets crawl_priority.py's); without one every URL gets 0 and
+# the frontier stays FIFO. A URL pushed again from a better referrer moves up,
+# and rescore() re-ranks queued URLs once the scorer has learned more: each
+# call takes the RESCORE_BATCH longest-unscored rows (a `scored` index), so
+# start-up cost stays flat however large the frontier grows, and the whole
+# frontier is refreshed over successive runs.
+#
+# One Frontier may be shared by stages running in different threads (see
+# pipeline.py); every access goes through self.lock.
+
+import json
+import threading
+import time
+
+from common import SQLiteStore
+
+FRONTIER_DB = "frontier.db"
+LEGACY_QUEUE_FILE = "queue.json"
+
+COMMIT_EVERY = 500  # flush to disk every N writes so a killed run keeps its progress
+RESCORE_BATCH = 20000  # queued URLs re-ranked per rescore() call
+
+COLUMNS = {
+    "priority": "REAL NOT NULL DEFAULT 0",
+    "referrer": "TEXT",
+    "scored": "REAL",  # when priority was last computed by a scorer (NULL: never)
+}
+
+
+class Frontier(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=FRONTIER_DB, legacy_file=LEGACY_QUEUE_FILE, scorer=None):
+        super().__init__(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS frontier ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL UNIQUE)"
+        )
+        self._migrate()
+        self.scorer = scorer
+        if self.created and legacy_file:
+            self._import_legacy(legacy_file)
+
+    def _migrate(self):
+        """Columns and indexes added since the first frontier.db."""
+        self.add_columns("frontier", COLUMNS)
+        self.db.execute("CREATE INDEX IF NOT EXISTS frontier_priority ON frontier (priority DESC, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS frontier_scored ON frontier (scored)")
+        self.db.commit()
+
+    def _import_legacy(self, legacy_file):
+        """One-time migration of the old queue.json list."""
+        try:
+            with open(legacy_file, "r", encoding="utf8") as f:
+                urls = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.extend(urls)
+        self.commit()
+        print(f"Frontier: imported {len(urls)} URLs from {legacy_file}")
+
+    def push(self, url, referrer=None):
+        """
+        Queue url behind everything of its priority. Returns False if it was
+        already queued (it still moves up if this referrer scores it higher).
+        """
+        priority = self.scorer(url, referrer) if self.scorer else 0
+        scored = time.time() if self.scorer else None
+        with self.lock:
+            cur = self.db.execute(
+                "INSERT OR IGNORE INTO frontier (url, priority, referrer, scored) VALUES (?, ?, ?, ?)",
+                (url, priority, referrer, scored),
+            )
+            if cur.rowcount:
+                self._wrote()
+                return True
+            cur = self.db.execute(
+                "UPDATE frontier SET priority = ?, referrer = ?, scored = ? WHERE url = ? AND priority < ?",
+                (priority, referrer, scored, url, priority),
+            )
+            if cur.rowcount:
+                self._wrote()
+            return False
+
+    def push_front(self, url):
+        """Put url at the head, moving it there if it is already queued."""
+        with self.lock:
+            self.db.execute("DELETE FROM frontier WHERE url = ?", (url,))
+            self.db.execute(
+                "INSERT INTO frontier (id, url, priority)"
+                " VALUES ((SELECT COALESCE(MIN(id), 1) - 1 FROM frontier),"
+                " ?, (SELECT COALESCE(MAX(priority), 0) + 1 FROM frontier))",
+                (url,),
+            )
+            self._wrote()
+
+    def extend(self, urls):
+        for url in urls:
+            self.push(url)
+
+    def pop(self):
+        """Remove and return the head URL, or None when the frontier is empty."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT id, url FROM frontier ORDER BY priority DESC, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self.db.execute("DELETE FROM frontier WHERE id = ?", (row[0],))
+            self._wrote()
+            return row[1]
+
+    def rescore(self, limit=RESCORE_BATCH):
+        """Recompute the priority of the `limit` longest-unscored URLs; returns the count."""
+        if not self.scorer:
+            return 0
+        now = time.time()
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT id, url, referrer FROM frontier ORDER BY scored LIMIT ?", (limit,)
+            ).fetchall()
+            self.db.executemany(
+                "UPDATE frontier SET priority = ?, scored = ? WHERE id = ?",
+                ((self.scorer(url, referrer), now, id_) for id_, url, referrer in rows),
+            )
+            self.commit()
+            return len(rows)
+
+    def __contains__(self, url):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM frontier WHERE url = ?", (url,)).fetchone() is not None
+
+    def __len__(self):
+        with self.lock:
+            return self.db.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def __bool__(self):
+        with self.lock:
+            return self.db.execute("SELECT 1 FROM frontier LIMIT 1").fetchone() is not None
+
+    def commit(self):
+        with self.lock:
+            super().commit()
+
+    def close(self):
+        with self.lock:
+            super().close()
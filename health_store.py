@@ -0,0 +1,172 @@
+# health_store.py
+# Persistent per-stream health history for tester.py.
+#
+# One row per stream URL with its last result, consecutive failures, recent
+# latencies (p50 / p90), last success time and whether it is currently
+# published. tester.py retests only a prioritised subset each run (new links,
+# published streams, a rotating sample of dead ones) and builds its playlist
+# from this table, so one noisy run neither publishes a flaky stream nor
+# drops a good one, and runtime follows churn instead of total history.
+#
+# Rows are keyed by the normalised URL (link_store.normalize_url), so the
+# spellings of one stream that tester.py stages as a single candidate share
+# one history; the URL as last tested is kept next to it and published.
+
+import json
+import os
+import time
+
+from channel import Channel, read_channels
+from common import SQLiteStore
+from link_store import normalize_url
+from m3u_parser import parse_extinf
+
+HEALTH_DB = "health.db"
+
+FAIL_THRESHOLD = 3   # consecutive failures before a published stream is dropped
+LATENCY_WINDOW = 20  # latencies kept per stream for the percentiles
+COMMIT_EVERY = 200
+
+SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS health ("
+    " key TEXT PRIMARY KEY,"
+    " url TEXT NOT NULL,"
+    " extinf TEXT NOT NULL,"
+    " last_status TEXT,"
+    " last_checked REAL,"
+    " last_success REAL,"
+    " fails INTEGER NOT NULL DEFAULT 0,"
+    " checks INTEGER NOT NULL DEFAULT 0,"
+    " successes INTEGER NOT NULL DEFAULT 0,"
+    " latencies TEXT NOT NULL DEFAULT '[]',"
+    " p50_ms INTEGER,"
+    " p90_ms INTEGER,"
+    " published INTEGER NOT NULL DEFAULT 0)"
+)
+
+
+def url_key(url):
+    return normalize_url(url) or url
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))]
+
+
+class HealthStore(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=HEALTH_DB, legacy_playlist=None):
+        super().__init__(path)
+        self._migrate()
+        self.db.execute(SCHEMA)
+        self.db.execute("CREATE INDEX IF NOT EXISTS health_checked ON health (published, last_checked)")
+        self.db.commit()
+        if self.created and legacy_playlist:
+            self._import_legacy(legacy_playlist)
+
+    def _migrate(self):
+        """Re-key a store created before rows were keyed by normalised URL."""
+        have = self.columns("health")
+        if not have or "key" in have:
+            return
+        self.db.execute("DROP INDEX IF EXISTS health_checked")
+        self.db.execute("ALTER TABLE health RENAME TO health_old")
+        self.db.execute(SCHEMA)
+        columns = ["url"] + sorted(self.columns("health") - {"key", "url"})
+        # spellings of one stream collapse into the most recently checked row
+        rows = self.db.execute(
+            f"SELECT {', '.join(columns)} FROM health_old ORDER BY last_checked IS NOT NULL, last_checked"
+        )
+        self.db.executemany(
+            f"INSERT OR REPLACE INTO health (key, {', '.join(columns)}) VALUES (?{', ?' * len(columns)})",
+            ((url_key(row[0]),) + row for row in rows),
+        )
+        self.db.execute("DROP TABLE health_old")
+        self.db.commit()
+
+    def _import_legacy(self, legacy_playlist):
+        """Seed with the last published snapshot; those streams get retested first."""
+        if not os.path.exists(legacy_playlist):
+            return
+        n = 0
+        for ch in read_channels(legacy_playlist):
+            n += self.db.execute(
+                "INSERT OR IGNORE INTO health (key, url, extinf, published) VALUES (?, ?, ?, 1)",
+                (url_key(ch.url), ch.url, ch.extinf()),
+            ).rowcount
+        self.commit()
+        print(f"Health: imported {n} published streams from {legacy_playlist}")
+
+    def _channel(self, url, extinf):
+        return Channel.from_entry(parse_extinf(extinf), url)
+
+    def __contains__(self, url):
+        return self.db.execute("SELECT 1 FROM health WHERE key = ?", (url_key(url),)).fetchone() is not None
+
+    def update_meta(self, ch):
+        """Refresh stored metadata for a known stream without testing it."""
+        if ch.has_meta:
+            self.db.execute("UPDATE health SET extinf = ? WHERE key = ?", (ch.extinf(), url_key(ch.url)))
+            self._wrote()
+
+    def record(self, ch, ok, reason="", latency=None, now=None):
+        """Store one check result. latency is in seconds (None if unknown)."""
+        now = now or time.time()
+        key = url_key(ch.url)
+        row = self.db.execute(
+            "SELECT fails, checks, successes, latencies, published, extinf, last_success"
+            " FROM health WHERE key = ?",
+            (key,),
+        ).fetchone()
+        fails, checks, successes, latencies, published, old_extinf, last_success = (
+            row or (0, 0, 0, "[]", 0, "", None)
+        )
+        latencies = json.loads(latencies)
+        if latency is not None:
+            latencies = (latencies + [round(latency * 1000)])[-LATENCY_WINDOW:]
+        if ok:
+            fails = 0
+            successes += 1
+            last_success = now
+            published = 1
+        else:
+            fails += 1
+            if fails >= FAIL_THRESHOLD:
+                published = 0
+        extinf = ch.extinf() if ch.has_meta or not old_extinf else old_extinf
+        self.db.execute(
+            "INSERT OR REPLACE INTO health"
+            " (key, url, extinf, last_status, last_checked, last_success, fails, checks, successes,"
+            "  latencies, p50_ms, p90_ms, published)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                key, ch.url, extinf, "ok" if ok else reason, now, last_success,
+                fails, checks + 1, successes, json.dumps(latencies),
+                percentile(latencies, 0.5) if latencies else None,
+                percentile(latencies, 0.9) if latencies else None,
+                published,
+            ),
+        )
+        self._wrote()
+
+    def retest_candidates(self, dead_sample):
+        """Published streams, plus the `dead_sample` longest-unchecked dead ones."""
+        for url, extinf in self.db.execute("SELECT url, extinf FROM health WHERE published = 1"):
+            yield self._channel(url, extinf)
+        for url, extinf in self.db.execute(
+            "SELECT url, extinf FROM health WHERE published = 0"
+            " ORDER BY last_checked LIMIT ?",
+            (dead_sample,),
+        ):
+            yield self._channel(url, extinf)
+
+    def published(self):
+        """Channels to publish, fastest (by median latency) first."""
+        rows = self.db.execute(
+            "SELECT url, extinf FROM health WHERE published = 1"
+            " ORDER BY p50_ms IS NULL, p50_ms, url"
+        )
+        for url, extinf in rows:
+            yield self._channel(url, extinf)
@@ -0,0 +1,158 @@
+# hls_probe.py
+# Deep validation of one stream URL for tester.py.
+#
+# A plain "HTTP 200" check passes HTML error pages and dead master playlists.
+# probe() instead:
+#   1. fetches the URL (at most PLAYLIST_BUDGET bytes) and checks that the
+#      body really is a playlist or media (an audio/video content type or
+#      MPEG-TS sync bytes), not an HTML page or some other file;
+#   2. for an HLS master playlist, collects the variant bitrates and follows
+#      the lowest-bandwidth variant to its media playlist;
+#   3. range-fetches the first SEGMENT_BUDGET bytes of the first segment.
+# Every step is bounded in bytes, and the whole probe is bounded in time by
+# the caller, so a run can validate thousands of streams concurrently.
+
+import asyncio
+import re
+import time
+from collections import namedtuple
+from urllib.parse import urljoin
+
+PLAYLIST_BUDGET = 256 * 1024
+SEGMENT_BUDGET = 64 * 1024
+
+BANDWIDTH_RE = re.compile(r"BANDWIDTH=(\d+)")
+
+MEDIA_TYPES = ("video/", "audio/", "mp2t", "octet-stream")
+TS_PACKET = 188
+TS_SYNC = 0x47
+
+LIST_REASON = "channel list"  # a playlist of channels, not a stream; tester.py sends it to the expander
+
+# ok: stream looks playable
+# kind: "hls" | "list" (IPTV playlist of channels, never ok) | "media" (direct stream)
+# reason: why it failed ("" when ok)
+# latency: seconds until the first response headers of the URL itself
+# variants: bitrates (bps) advertised by a master playlist, lowest first
+ProbeResult = namedtuple("ProbeResult", "url ok kind reason latency variants")
+
+
+class ProbeError(Exception):
+    pass
+
+
+async def fetch_head_bytes(session, url, budget, headers=None):
+    """(status, content_type, first `budget` bytes of the body, seconds until the headers)."""
+    start = time.monotonic()
+    async with session.get(url, headers=headers) as r:
+        elapsed = time.monotonic() - start
+        chunks, total = [], 0
+        if r.status in (200, 206):
+            async for chunk in r.content.iter_chunked(16384):
+                chunks.append(chunk)
+                total += len(chunk)
+                if total >= budget:
+                    break
+        return r.status, r.headers.get("Content-Type", "").lower(), b"".join(chunks)[:budget], elapsed
+
+
+def is_html(content_type, data):
+    head = data[:512].lstrip().lower()
+    return "html" in content_type or head.startswith((b"<!doctype", b"<html"))
+
+
+def is_media(content_type, data):
+    """An audio/video content type, or two MPEG-TS packets in a row."""
+    if any(t in content_type for t in MEDIA_TYPES):
+        return True
+    return len(data) > TS_PACKET and data[0] == TS_SYNC and data[TS_PACKET] == TS_SYNC
+
+
+def parse_master(base_url, text):
+    """[(bandwidth, variant_url)] from an HLS master playlist."""
+    variants = []
+    bandwidth = None
+    for line in text.splitlines():
+        line = line.strip()
+        if line.startswith("#EXT-X-STREAM-INF"):
+            m = BANDWIDTH_RE.search(line)
+            bandwidth = int(m.group(1)) if m else 0
+        elif line and not line.startswith("#") and bandwidth is not None:
+            variants.append((bandwidth, urljoin(base_url, line)))
+            bandwidth = None
+    return sorted(variants)
+
+
+def first_segment(base_url, text):
+    for line in text.splitlines():
+        line = line.strip()
+        if line and not line.startswith("#"):
+            return urljoin(base_url, line)
+    return None
+
+
+async def check_segment(session, url):
+    headers = {"Range": f"bytes=0-{SEGMENT_BUDGET - 1}"}
+    status, content_type, data, _ = await fetch_head_bytes(session, url, SEGMENT_BUDGET, headers)
+    if status not in (200, 206):
+        raise ProbeError(f"segment http {status}")
+    if not data:
+        raise ProbeError("segment empty")
+    if is_html(content_type, data):
+        raise ProbeError("segment is html")
+
+
+async def check_media_playlist(session, url, text):
+    segment = first_segment(url, text)
+    if segment is None:
+        raise ProbeError("no segments")
+    await check_segment(session, segment)
+
+
+async def probe(session, url):
+    latency = None
+    variants = ()
+    kind = "media"
+    try:
+        status, content_type, data, latency = await fetch_head_bytes(session, url, PLAYLIST_BUDGET)
+        if status != 200:
+            raise ProbeError(f"http {status}")
+        if not data:
+            raise ProbeError("empty body")
+        if is_html(content_type, data):
+            raise ProbeError("html body")
+
+        text = data.decode("utf-8", errors="ignore")
+        if not text.lstrip("\ufeff \r\n").startswith("#EXTM3U") and "mpegurl" not in content_type:
+            # not a playlist: fine if it is a direct media stream
+            if not is_media(content_type, data):
+                raise ProbeError("not media")
+            return ProbeResult(url, True, "media", "", latency, variants)
+
+        if "#EXT-X-STREAM-INF" in text:
+            kind = "hls"
+            master = parse_master(url, text)
+            if not master:
+                raise ProbeError("master without variants")
+            variants = tuple(bw for bw, _ in master)
+            variant_url = master[0][1]
+            status, content_type, data, _ = await fetch_head_bytes(session, variant_url, PLAYLIST_BUDGET)
+            if status != 200:
+                raise ProbeError(f"variant http {status}")
+            await check_media_playlist(session, variant_url, data.decode("utf-8", errors="ignore"))
+        elif "#EXT-X-TARGETDURATION" in text:
+            kind = "hls"
+            await check_media_playlist(session, url, text)
+        else:
+            # a plain IPTV channel list: not playable itself, its entries are
+            kind = "list"
+            if "#EXTINF" not in text and first_segment(url, text) is None:
+                raise ProbeError("empty playlist")
+            raise ProbeError(LIST_REASON)
+        return ProbeResult(url, True, kind, "", latency, variants)
+    except ProbeError as e:
+        return ProbeResult(url, False, kind, str(e), latency, variants)
+    except asyncio.TimeoutError:
+        return ProbeResult(url, False, kind, "timeout", latency, variants)
+    except Exception as e:
+        return ProbeResult(url, False, kind, type(e).__name__, latency, variants)
@@ -0,0 +1,141 @@
+# host_budget.py
+# Per-host adaptive concurrency for tester.py.
+#
+# Each host gets its own concurrency limit that is tuned AIMD-style from what
+# we observe: every clean, fast response raises it by 1/limit (about +1 per
+# round of requests), every timeout, throttling status, connection error or
+# slow response halves it. A few CDN hosts carrying thousands of URLs can
+# therefore no longer take the whole connection pool, and hosts that start
+# rate-limiting us get backed off before they turn into false failures.
+#
+# HostScheduler pulls work items lazily from any iterable or async iterator,
+# keeps at most `max_waiting` of them parked for hosts that are at their
+# limit, and never has more than `concurrency` tasks alive.
+
+import asyncio
+import time
+from collections import defaultdict, deque
+
+
+class HostBudget:
+    def __init__(self, initial=4, minimum=1, maximum=32, slow_latency=5.0):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.slow_latency = slow_latency
+        self.limit = {}
+        self.active = defaultdict(int)
+
+    def limit_for(self, host):
+        return self.limit.get(host, self.initial)
+
+    def can_start(self, host):
+        return self.active[host] < int(self.limit_for(host))
+
+    def start(self, host):
+        self.active[host] += 1
+
+    def done(self, host, congested, latency):
+        """Feed back one result; congested=True for timeouts, 429/503, resets."""
+        self.active[host] -= 1
+        limit = self.limit_for(host)
+        if congested or latency > self.slow_latency:
+            limit = max(self.minimum, limit / 2)
+        else:
+            limit = min(self.maximum, limit + 1 / limit)
+        self.limit[host] = limit
+
+
+class HostScheduler:
+    def __init__(self, budget, concurrency=100, max_waiting=2000):
+        self.budget = budget
+        self.concurrency = concurrency
+        self.max_waiting = max_waiting
+
+    async def _run_one(self, work, item, host):
+        start = time.monotonic()
+        congested = True
+        try:
+            congested = await work(item)
+        finally:
+            self.budget.done(host, congested, time.monotonic() - start)
+
+    async def run(self, items, host_of, work):
+        """
+        Run `work(item)` for every item, respecting per-host budgets.
+        - items: iterable, or async iterator (e.g. fed by producers in
+          pipeline.py's stream mode); pulled only when there is room
+        - host_of(item): the host to account the item against
+        - work(item): coroutine returning True if the host looked congested
+        """
+        waiting = defaultdict(deque)
+        n_waiting = 0
+        running = set()
+        is_async = hasattr(items, "__anext__")
+        if not is_async:
+            items = iter(items)
+        exhausted = False
+        pulling = None  # pending __anext__() of an async source
+
+        def launch(item, host):
+            # count the slot now, not when the task first runs
+            self.budget.start(host)
+            running.add(asyncio.create_task(self._run_one(work, item, host)))
+
+        def place(item):
+            nonlocal n_waiting
+            host = host_of(item)
+            if self.budget.can_start(host):
+                launch(item, host)
+            else:
+                waiting[host].append(item)
+                n_waiting += 1
+
+        while True:
+            # parked items whose host has room again go first
+            for host in list(waiting):
+                if len(running) >= self.concurrency:
+                    break
+                queue = waiting[host]
+                while queue and self.budget.can_start(host) and len(running) < self.concurrency:
+                    launch(queue.popleft(), host)
+                    n_waiting -= 1
+                if not queue:
+                    del waiting[host]
+
+            # then pull new items, parking those whose host is at its limit
+            has_room = len(running) < self.concurrency and n_waiting < self.max_waiting
+            if is_async:
+                # one pull in flight at a time, awaited alongside the running tasks
+                if pulling is None and not exhausted and has_room:
+                    pulling = asyncio.ensure_future(items.__anext__())
+            else:
+                while not exhausted and len(running) < self.concurrency and n_waiting < self.max_waiting:
+                    item = next(items, None)
+                    if item is None:
+                        exhausted = True
+                        break
+                    place(item)
+
+            if not running and pulling is None:
+                if exhausted and not waiting:
+                    return
+                # every parked host is at its limit with nothing running cannot
+                # happen (limits are >= 1), but never spin if it does
+                await asyncio.sleep(0.05)
+                continue
+
+            done, _ = await asyncio.wait(
+                running | {pulling} if pulling else running,
+                return_when=asyncio.FIRST_COMPLETED,
+            )
+            if pulling in done:
+                try:
+                    place(pulling.result())
+                except StopAsyncIteration:
+                    exhausted = True
+                pulling = None
+            for task in done & running:
+                if task.exception() is not None:
+                    print(f"Scheduler task failed: {task.exception()!r}")
+            running -= done
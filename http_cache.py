@@ -0,0 +1,300 @@
+# http_cache.py
+# Conditional-GET cache shared by crawler.py, recursive_expander.py and
+# flatten_m3u.py.
+#
+# Responses that carry an ETag or Last-Modified header are kept on disk
+# (body files under CACHE_DIR, validators in a small SQLite index). The next
+# request for the same URL sends If-None-Match / If-Modified-Since, and a 304
+# is answered from the local copy, so an unchanged multi-megabyte playlist
+# costs one round trip and no download.
+#
+# CACHE_DIR is not committed; the workflow restores it with actions/cache.
+
+import hashlib
+import os
+import time
+
+import requests
+
+from common import SQLiteStore
+
+CACHE_DIR = os.path.join(".cache", "http")
+MAX_AGE = 14 * 24 * 3600  # drop entries nobody asked for in this long
+CHUNK_SIZE = 65536
+COMMIT_EVERY = 50
+ORPHAN_AGE = 24 * 3600  # unindexed files older than this are removed by prune()
+
+
+def _unlink(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class HTTPCache(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, root=CACHE_DIR):
+        self.root = root
+        super().__init__(os.path.join(root, "index.db"))
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS entries ("
+            " url TEXT PRIMARY KEY,"
+            " etag TEXT,"
+            " last_modified TEXT,"
+            " content_type TEXT,"
+            " used REAL NOT NULL)"
+        )
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, url):
+        return os.path.join(self.root, hashlib.sha1(url.encode()).hexdigest())
+
+    def conditional_headers(self, url):
+        row = self.db.execute(
+            "SELECT etag, last_modified FROM entries WHERE url = ?", (url,)
+        ).fetchone()
+        headers = {}
+        if row:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def lookup(self, url):
+        """Cached (content_type, body) for url, or None."""
+        content_type = self.lookup_type(url)
+        chunks = self._cached_chunks(url)
+        if chunks is None:
+            return None
+        return content_type, b"".join(chunks)
+
+    def store(self, url, headers, body):
+        """Keep body if the response is revalidatable; otherwise forget url."""
+        if not self._revalidatable(url, headers):
+            return
+        path = self._path(url)
+        with open(path + ".tmp", "wb") as f:
+            f.write(body)
+        os.replace(path + ".tmp", path)
+        self._index(url, headers)
+
+    def _revalidatable(self, url, headers):
+        if headers.get("ETag") or headers.get("Last-Modified"):
+            return True
+        self._forget(url)
+        return False
+
+    def _forget(self, url):
+        """Drop url's index row and its body file."""
+        self.db.execute("DELETE FROM entries WHERE url = ?", (url,))
+        _unlink(self._path(url))
+
+    def _index(self, url, headers):
+        self.db.execute(
+            "INSERT OR REPLACE INTO entries (url, etag, last_modified, content_type, used)"
+            " VALUES (?, ?, ?, ?, ?)",
+            (url, headers.get("ETag"), headers.get("Last-Modified"),
+             headers.get("Content-Type", ""), time.time()),
+        )
+        self._wrote()
+
+    def _cached_chunks(self, url):
+        """Chunks of the cached body, or None if there is no usable copy."""
+        if self.lookup_type(url) is None:
+            return None
+        try:
+            f = open(self._path(url), "rb")
+        except FileNotFoundError:
+            self._forget(url)
+            return None
+        self.db.execute("UPDATE entries SET used = ? WHERE url = ?", (time.time(), url))
+        self.hits += 1
+        def chunks():
+            with f:
+                while True:
+                    chunk = f.read(CHUNK_SIZE)
+                    if not chunk:
+                        return
+                    yield chunk
+        return chunks()
+
+    def lookup_type(self, url):
+        row = self.db.execute("SELECT content_type FROM entries WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    # -----------------------------
+    # Fetch helpers
+    # -----------------------------
+    # Both return (content_type, body):
+    #   - (None, None) on network error / non-200 status / rejected type
+    #   - (content_type, None) when the body is larger than max_size
+    # accept(content_type) runs on the response headers, before the body is
+    # downloaded, so unwanted types are never read.
+    #
+    # A 304 for a URL whose body file has gone missing closes that response
+    # and asks once more without validators.
+
+    def _request_headers(self, url, headers, conditional):
+        req_headers = dict(headers or {})
+        if conditional:
+            req_headers.update(self.conditional_headers(url))
+        return req_headers
+
+    def get(self, url, timeout=10, max_size=None, accept=None, headers=None):
+        for conditional in (True, False):
+            req_headers = self._request_headers(url, headers, conditional)
+            try:
+                with requests.get(url, timeout=timeout, stream=True, headers=req_headers) as r:
+                    if r.status_code == 304:
+                        cached = self.lookup(url)
+                        if cached is not None:
+                            return cached
+                        continue
+                    content_type = r.headers.get("Content-Type", "")
+                    if r.status_code != 200 or (accept and not accept(content_type)):
+                        return None, None
+                    chunks, total = [], 0
+                    for chunk in r.iter_content(CHUNK_SIZE):
+                        total += len(chunk)
+                        if max_size and total > max_size:
+                            return content_type, None
+                        chunks.append(chunk)
+                    body = b"".join(chunks)
+                    self.misses += 1
+                    self.store(url, r.headers, body)
+                    return content_type, body
+            except Exception:
+                return None, None
+        return None, None
+
+    async def get_async(self, session, url, max_size=None, accept=None, headers=None):
+        for conditional in (True, False):
+            req_headers = self._request_headers(url, headers, conditional)
+            try:
+                async with session.get(url, headers=req_headers) as r:
+                    if r.status == 304:
+                        cached = self.lookup(url)
+                        if cached is not None:
+                            return cached
+                        continue
+                    content_type = r.headers.get("Content-Type", "")
+                    if r.status != 200 or (accept and not accept(content_type)):
+                        return None, None
+                    chunks, total = [], 0
+                    async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                        total += len(chunk)
+                        if max_size and total > max_size:
+                            return content_type, None
+                        chunks.append(chunk)
+                    body = b"".join(chunks)
+                    self.misses += 1
+                    self.store(url, r.headers, body)
+                    return content_type, body
+            except Exception:
+                return None, None
+        return None, None
+
+    # -----------------------------
+    # Streaming helpers
+    # -----------------------------
+    # Yield the body chunk by chunk without ever holding it in memory. A 304
+    # replays the cached file; a fresh 200 is teed to disk while it streams
+    # and indexed once complete (an abandoned stream's partial file is
+    # removed). Nothing is yielded on error / non-200 / rejected type; errors
+    # in the middle of the body propagate.
+
+    def iter_body(self, url, timeout=10, accept=None, headers=None):
+        for conditional in (True, False):
+            req_headers = self._request_headers(url, headers, conditional)
+            try:
+                r = requests.get(url, timeout=timeout, stream=True, headers=req_headers)
+            except Exception:
+                return
+            with r:
+                if r.status_code == 304:
+                    cached = self._cached_chunks(url)
+                    if cached is not None:
+                        yield from cached
+                        return
+                    continue
+                if r.status_code != 200 or (accept and not accept(r.headers.get("Content-Type", ""))):
+                    return
+                self.misses += 1
+                keep = self._revalidatable(url, r.headers)
+                part = self._path(url) + ".part"
+                complete = False
+                try:
+                    with open(part if keep else os.devnull, "wb") as f:
+                        for chunk in r.iter_content(CHUNK_SIZE):
+                            f.write(chunk)
+                            yield chunk
+                    complete = True
+                finally:
+                    if keep and not complete:
+                        _unlink(part)
+                if keep:
+                    os.replace(part, self._path(url))
+                    self._index(url, r.headers)
+                return
+
+    async def iter_body_async(self, session, url, accept=None, headers=None):
+        for conditional in (True, False):
+            req_headers = self._request_headers(url, headers, conditional)
+            try:
+                r = await session.get(url, headers=req_headers)
+            except Exception:
+                return
+            async with r:
+                if r.status == 304:
+                    cached = self._cached_chunks(url)
+                    if cached is not None:
+                        for chunk in cached:
+                            yield chunk
+                        return
+                    continue
+                if r.status != 200 or (accept and not accept(r.headers.get("Content-Type", ""))):
+                    return
+                self.misses += 1
+                keep = self._revalidatable(url, r.headers)
+                part = self._path(url) + ".part"
+                complete = False
+                try:
+                    with open(part if keep else os.devnull, "wb") as f:
+                        async for chunk in r.content.iter_chunked(CHUNK_SIZE):
+                            f.write(chunk)
+                            yield chunk
+                    complete = True
+                finally:
+                    if keep and not complete:
+                        _unlink(part)
+                if keep:
+                    os.replace(part, self._path(url))
+                    self._index(url, r.headers)
+                return
+
+    def prune(self, max_age=MAX_AGE):
+        cutoff = time.time() - max_age
+        stale = [r[0] for r in self.db.execute("SELECT url FROM entries WHERE used < ?", (cutoff,))]
+        for url in stale:
+            _unlink(self._path(url))
+        self.db.execute("DELETE FROM entries WHERE used < ?", (cutoff,))
+        # bodies without an index row, and partial files a killed run left
+        # behind (anything younger may belong to a concurrent download)
+        indexed = {os.path.basename(self._path(r[0])) for r in self.db.execute("SELECT url FROM entries")}
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.startswith("index.db") or name in indexed:
+                continue
+            try:
+                if os.path.getmtime(path) < time.time() - ORPHAN_AGE:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def close(self):
+        self.prune()
+        super().close()
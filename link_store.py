@@ -0,0 +1,152 @@
+# link_store.py
+# Deduplicated store of candidate stream links, replacing the append-only
+# found_links.txt.
+#
+# Every URL is normalised before it is stored (scheme/host case, default
+# ports, fragments, tracking parameters), so the same link found on many
+# pages is one row with first_seen / last_seen times. Rows get increasing
+# ids in first-seen order, and each downstream stage keeps a cursor: the id
+# of the last link it has processed. unprocessed(stage) returns only what
+# arrived after that, so a stage works on new links instead of the whole
+# history.
+#
+# Each link also keeps its source: the page it was first found on. tester.py
+# passes it on with the channel, and build_playlist.py credits that page with
+# what the link turned out to be (crawl_priority.py).
+
+import time
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from common import SQLiteStore
+
+LINKS_DB = "links.db"
+LEGACY_FOUND_FILE = "found_links.txt"
+
+COMMIT_EVERY = 500
+
+COLUMNS = {
+    "source": "TEXT",  # page the link was first found on
+}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+TRACKING_PARAMS = {"fbclid", "gclid", "dclid", "msclkid", "yclid", "igshid", "mc_cid", "mc_eid", "ref_src"}
+
+
+def normalize_url(url):
+    """Canonical form of url, or None if it is not an http(s) URL."""
+    try:
+        parts = urlsplit(url.strip())
+        scheme = parts.scheme.lower()
+        if scheme not in DEFAULT_PORTS:
+            return None
+        host = (parts.hostname or "").lower()
+        if not host:
+            return None
+        port = parts.port
+    except ValueError:
+        return None
+    netloc = host
+    if parts.username:
+        userinfo = parts.username + (f":{parts.password}" if parts.password else "")
+        netloc = f"{userinfo}@{host}"
+    if port and port != DEFAULT_PORTS[scheme]:
+        netloc += f":{port}"
+    query = parts.query
+    if query:
+        pairs = parse_qsl(query, keep_blank_values=True)
+        kept = [(k, v) for k, v in pairs if not k.lower().startswith("utm_") and k.lower() not in TRACKING_PARAMS]
+        if len(kept) != len(pairs):
+            query = urlencode(kept)
+    return urlunsplit((scheme, netloc, parts.path or "/", query, ""))
+
+
+class LinkStore(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=LINKS_DB, legacy_file=LEGACY_FOUND_FILE):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS links ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " url TEXT NOT NULL UNIQUE,"
+            " first_seen REAL NOT NULL,"
+            " last_seen REAL NOT NULL)"
+        )
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS cursors ("
+            " stage TEXT PRIMARY KEY,"
+            " last_id INTEGER NOT NULL)"
+        )
+        self.add_columns("links", COLUMNS)
+        if self.created and legacy_file:
+            self._import_legacy(legacy_file)
+
+    def _import_legacy(self, legacy_file):
+        """One-time migration of found_links.txt (duplicates collapse here)."""
+        try:
+            with open(legacy_file, "r", encoding="utf8", errors="ignore") as f:
+                n = sum(1 for line in f if self.add(line))
+        except FileNotFoundError:
+            return
+        self.commit()
+        print(f"Links: imported {n} unique links from {legacy_file}")
+
+    def add(self, url, now=None, source=None):
+        """Store url (normalised), found on page `source`. Returns True if it was not known before."""
+        url = normalize_url(url)
+        if url is None:
+            return False
+        now = now or time.time()
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO links (url, first_seen, last_seen, source) VALUES (?, ?, ?, ?)",
+            (url, now, now, source),
+        )
+        is_new = cur.rowcount == 1
+        if not is_new:
+            self.db.execute(
+                "UPDATE links SET last_seen = ?, source = COALESCE(source, ?) WHERE url = ?",
+                (now, source, url),
+            )
+        self._wrote()
+        return is_new
+
+    def __contains__(self, url):
+        url = normalize_url(url)
+        return url is not None and self.db.execute(
+            "SELECT 1 FROM links WHERE url = ?", (url,)
+        ).fetchone() is not None
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM links").fetchone()[0]
+
+    def last_id(self):
+        return self.db.execute("SELECT COALESCE(MAX(id), 0) FROM links").fetchone()[0]
+
+    # -----------------------------
+    # Per-stage cursors
+    # -----------------------------
+
+    def cursor(self, stage):
+        row = self.db.execute("SELECT last_id FROM cursors WHERE stage = ?", (stage,)).fetchone()
+        return row[0] if row else 0
+
+    def unprocessed(self, stage):
+        """(id, url) pairs first seen after stage's cursor, oldest first."""
+        return self.db.execute(
+            "SELECT id, url FROM links WHERE id > ? ORDER BY id", (self.cursor(stage),)
+        ).fetchall()
+
+    def iter_unprocessed(self, stage):
+        """Like unprocessed(), but streamed from the database, as (id, url, source)."""
+        return self.db.execute(
+            "SELECT id, url, source FROM links WHERE id > ? ORDER BY id", (self.cursor(stage),)
+        )
+
+    def mark_processed(self, stage, last_id):
+        """Move stage's cursor forward to last_id."""
+        self.db.execute(
+            "INSERT INTO cursors (stage, last_id) VALUES (?, ?)"
+            " ON CONFLICT(stage) DO UPDATE SET last_id = MAX(last_id, excluded.last_id)",
+            (stage, last_id),
+        )
+        self.commit()
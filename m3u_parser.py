@@ -0,0 +1,98 @@
+# m3u_parser.py
+# Incremental, line-oriented M3U parser.
+#
+# Feed it raw response chunks as they arrive and it hands back one
+# (attrs, url) record per playlist entry, where attrs holds the parsed
+# #EXTINF line ("duration", "name" and any key="value" pairs such as
+# tvg-id, tvg-logo, group-title). Only the current partial line is
+# buffered, so memory stays flat however large the playlist is.
+#
+# A line that is not an absolute URL is only taken as a (relative) entry
+# right after an #EXTINF line; anything else is stray text, not a link.
+#
+# `hls` turns True once an #EXT-X-* tag has been read: the document is an HLS
+# playlist, whose entries are variants or segments of one stream, not channels.
+
+import re
+from urllib.parse import urljoin
+
+EXTINF_RE = re.compile(r'#EXTINF:\s*(-?[\d.]+)?((?:\s*[\w-]+="[^"]*")*)[^,]*,(.*)')
+ATTR_RE = re.compile(r'([\w-]+)="([^"]*)"')
+SCHEME_RE = re.compile(r"[A-Za-z][A-Za-z0-9+.-]*://")
+
+MAX_LINE = 65536  # a "line" longer than this is not M3U; drop it
+
+
+def parse_extinf(line):
+    """'#EXTINF:-1 tvg-id="x" group-title="y",Name' -> {'duration': '-1', 'tvg-id': 'x', ...}"""
+    m = EXTINF_RE.match(line)
+    if not m:
+        # malformed: keep whatever follows the last comma as the name
+        return {"duration": "-1", "name": line.rsplit(",", 1)[-1].strip() if "," in line else ""}
+    attrs = dict(ATTR_RE.findall(m.group(2)))
+    attrs["duration"] = m.group(1) or "-1"
+    attrs["name"] = m.group(3).strip()
+    return attrs
+
+
+def format_extinf(attrs):
+    """Inverse of parse_extinf."""
+    extra = "".join(f' {k}="{v}"' for k, v in attrs.items() if k not in ("duration", "name"))
+    return f'#EXTINF:{attrs.get("duration", "-1")}{extra},{attrs.get("name", "")}'
+
+
+class M3UParser:
+    def __init__(self, base_url=None, encoding="utf-8"):
+        self.base_url = base_url
+        self.encoding = encoding
+        self.buf = b""
+        self.attrs = None
+        self.hls = False
+
+    def feed(self, chunk):
+        """Consume a chunk of bytes; return records for the lines it completed."""
+        *lines, self.buf = (self.buf + chunk).split(b"\n")
+        if len(self.buf) > MAX_LINE:
+            self.buf = b""
+        return [rec for rec in map(self._line, lines) if rec]
+
+    def close(self):
+        """Flush the final line (playlists often lack a trailing newline)."""
+        rest, self.buf = self.buf, b""
+        rec = self._line(rest)
+        return [rec] if rec else []
+
+    def _line(self, raw):
+        line = raw.decode(self.encoding, errors="ignore").strip().lstrip("\ufeff")
+        if not line:
+            return None
+        if line.startswith("#EXTINF"):
+            self.attrs = parse_extinf(line)
+            return None
+        if line.startswith("#"):
+            if line.startswith("#EXT-X-"):
+                self.hls = True
+            return None
+        if self.attrs is None and not SCHEME_RE.match(line):
+            return None
+        url = urljoin(self.base_url, line) if self.base_url else line
+        attrs, self.attrs = self.attrs or {}, None
+        return attrs, url
+
+
+def iter_m3u(chunks, base_url=None):
+    """Records from an iterable of byte chunks."""
+    parser = M3UParser(base_url)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aiter_m3u(chunks, base_url=None):
+    """Records from an async iterable of byte chunks."""
+    parser = M3UParser(base_url)
+    async for chunk in chunks:
+        for rec in parser.feed(chunk):
+            yield rec
+    for rec in parser.close():
+        yield rec
@@ -0,0 +1,260 @@
+# pipeline.py
+# Runs the whole crawl in one process:
+#
+#   python -m pipeline                      # every stage
+#   python -m pipeline --only tester build_playlist
+#   python -m pipeline --skip search_crawler repo_scanner
+#   python -m pipeline --resume             # skip stages an interrupted run finished
+#   python -m pipeline --stream             # test links while discovery still runs
+#
+# Every stage is the main() of its script (each script still runs on its own
+# too). Modules are imported once, and the stages that feed the crawl
+# frontier share one open Frontier instead of reopening it. Stages run in
+# waves: everything whose dependencies are done starts together, in threads
+# when there is more than one (the search and repo scanners and the expander
+# all run side by side), on the main thread when it runs alone.
+#
+# After each stage the shared frontier is committed and the stage is recorded
+# in CHECKPOINT_FILE, so --resume can pick up after a crash or timeout.
+#
+# --stream runs discovery and testing at the same time instead: the crawler
+# and the expander hand every new stream link to a bounded queue as they find
+# it, tester.py validates from that queue while they run (ahead of its usual
+# retests), and the playlist is rebuilt every PUBLISH_INTERVAL seconds. A full
+# queue makes the producers wait, so memory stays bounded however far ahead
+# discovery gets. The search and repo scanners only feed the frontier; they
+# run in threads next to the crawler.
+
+import argparse
+import asyncio
+import importlib
+import json
+import os
+import signal
+import sys
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from frontier import Frontier
+
+CHECKPOINT_FILE = os.path.join(".cache", "pipeline.json")
+
+# after: stages that must finish first (when they are part of this run)
+# frontier: main() takes the shared Frontier
+Stage = namedtuple("Stage", "name after frontier")
+
+STAGES = [
+    Stage("dedupe_keywords", (), False),
+    Stage("search_crawler", (), True),
+    Stage("repo_scanner", (), True),
+    Stage("recursive_expander", (), False),
+    Stage("expand_keywords", ("dedupe_keywords",), False),
+    Stage("crawler", ("dedupe_keywords", "search_crawler", "repo_scanner", "recursive_expander"), True),
+    Stage("tester", ("crawler",), False),
+    Stage("build_playlist", ("tester",), False),
+    Stage("flatten_m3u", ("build_playlist",), False),
+]
+STAGE_NAMES = [s.name for s in STAGES]
+STAGE_BY_NAME = {s.name: s for s in STAGES}
+
+# --stream: batch stages before and after the streaming section
+STREAM_BEFORE = ["dedupe_keywords"]
+STREAM_AFTER = ["expand_keywords", "build_playlist", "flatten_m3u"]
+STREAM_QUEUE_SIZE = 1000  # discovered links waiting for tester
+PUBLISH_INTERVAL = 120    # seconds between playlist rebuilds while streaming
+
+# -----------------------------
+# Checkpoints
+# -----------------------------
+
+def load_checkpoint():
+    try:
+        with open(CHECKPOINT_FILE, "r", encoding="utf8") as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {"done": [], "finished": True}
+
+def save_checkpoint(state):
+    os.makedirs(os.path.dirname(CHECKPOINT_FILE), exist_ok=True)
+    with open(CHECKPOINT_FILE + ".part", "w", encoding="utf8") as f:
+        json.dump(state, f)
+    os.replace(CHECKPOINT_FILE + ".part", CHECKPOINT_FILE)
+
+# -----------------------------
+# Running stages
+# -----------------------------
+
+def run_stage(stage, frontier):
+    """Run one stage; returns True if it completed."""
+    print(f"=== {stage.name} ===", flush=True)
+    start = time.monotonic()
+    try:
+        main = importlib.import_module(stage.name).main
+        if stage.frontier:
+            main(frontier=frontier)
+        else:
+            main()
+    except Exception:
+        traceback.print_exc()
+        print(f"=== {stage.name} failed after {time.monotonic() - start:.0f}s ===", flush=True)
+        return False
+    print(f"=== {stage.name} done in {time.monotonic() - start:.0f}s ===", flush=True)
+    return True
+
+def run(selected, done=()):
+    """Run the selected stages in dependency waves; returns the names that failed."""
+    state = {"done": list(done), "finished": False}
+    save_checkpoint(state)
+    pending = [s for s in STAGES if s.name in selected and s.name not in done]
+    finished = set(done)
+    failed = set()
+    frontier = Frontier()
+    try:
+        while pending:
+            # dependencies outside this run are taken as already satisfied
+            blocked = {s.name for s in pending}
+            wave = [s for s in pending if not any(dep in blocked for dep in s.after)]
+            pending = [s for s in pending if s not in wave]
+            skipped = [s for s in wave if any(dep in failed for dep in s.after)]
+            for stage in skipped:
+                print(f"=== {stage.name} skipped: a dependency failed ===")
+                failed.add(stage.name)
+            wave = [s for s in wave if s not in skipped]
+            if len(wave) == 1:
+                results = [run_stage(wave[0], frontier)]
+            else:
+                with ThreadPoolExecutor(len(wave)) as pool:
+                    results = list(pool.map(lambda s: run_stage(s, frontier), wave))
+            frontier.commit()
+            for stage, ok in zip(wave, results):
+                (finished if ok else failed).add(stage.name)
+            state["done"] = [name for name in STAGE_NAMES if name in finished]
+            save_checkpoint(state)
+    finally:
+        frontier.close()
+    state["finished"] = not failed
+    save_checkpoint(state)
+    return failed
+
+# -----------------------------
+# Stream mode
+# -----------------------------
+
+async def publish_periodically():
+    import build_playlist
+    import tester
+    while True:
+        await asyncio.sleep(PUBLISH_INTERVAL)
+        print(f"Published {tester.publish()} streams so far.", flush=True)
+        build_playlist.main()
+
+async def stream(frontier, crawl, start_links):
+    import crawler
+    import recursive_expander
+    import tester
+
+    queue = asyncio.Queue(STREAM_QUEUE_SIZE)
+    crawler.stream_sink = recursive_expander.stream_sink = queue.put
+    consumer = asyncio.create_task(tester.test_all(tester.streamed_candidates(queue)))
+    publisher = asyncio.create_task(publish_periodically())
+    producers = asyncio.gather(
+        # blocking scanners get threads; they only push to the (locked) frontier
+        asyncio.to_thread(run_stage, STAGE_BY_NAME["search_crawler"], frontier),
+        asyncio.to_thread(run_stage, STAGE_BY_NAME["repo_scanner"], frontier),
+        crawl.run(),
+        recursive_expander.expand(start_links),
+    )
+    try:
+        done, _ = await asyncio.wait({producers, consumer}, return_when=asyncio.FIRST_COMPLETED)
+        if consumer in done:
+            # tester cannot end before the None below; fail instead of blocking producers
+            consumer.result()
+            raise RuntimeError("tester stopped before discovery finished")
+        producers.result()
+        await queue.put(None)  # discovery is done; tester drains the queue and stops
+        await consumer
+    finally:
+        publisher.cancel()
+        consumer.cancel()
+        producers.cancel()
+        crawler.stream_sink = recursive_expander.stream_sink = None
+
+def run_streaming():
+    """Discovery and testing in one event loop; returns True if it completed."""
+    import crawler
+    import recursive_expander
+    import tester
+    from http_cache import HTTPCache
+    from link_store import LinkStore
+
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    print("=== streaming: crawler, recursive_expander, scanners -> tester ===", flush=True)
+    start = time.monotonic()
+    frontier = Frontier()
+    link_store = LinkStore()
+    http_cache = HTTPCache()
+    finished = False
+    try:
+        tester.prepare(link_store)
+        start_links = recursive_expander.prepare(link_store, http_cache)
+        crawler.prepare(frontier, link_store, http_cache)
+        crawl = crawler.make_crawler()
+        try:
+            asyncio.run(asyncio.wait_for(stream(frontier, crawl, start_links), tester.MAX_RUNTIME))
+            finished = True
+        except (asyncio.TimeoutError, KeyboardInterrupt):
+            print("Streaming stopped early; publishing partial results.")
+        except Exception:
+            traceback.print_exc()
+        finally:
+            crawler.finish(crawl.pages)
+            recursive_expander.finish(finished)
+            tester.finish(finished, shared_links=True)
+    finally:
+        link_store.close()
+        http_cache.close()
+        frontier.close()
+    print(f"=== streaming {'done' if finished else 'stopped'} after {time.monotonic() - start:.0f}s ===", flush=True)
+    return finished
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m pipeline", description="Run the crawl stages in one process.")
+    parser.add_argument("--only", nargs="+", choices=STAGE_NAMES, metavar="STAGE", help="run just these stages")
+    parser.add_argument("--skip", nargs="+", choices=STAGE_NAMES, default=[], metavar="STAGE", help="leave these stages out")
+    parser.add_argument("--resume", action="store_true", help="skip the stages an unfinished previous run completed")
+    parser.add_argument("--stream", action="store_true", help="test links while discovery still runs")
+    parser.add_argument("--list", action="store_true", help="print the stages and exit")
+    args = parser.parse_args(argv)
+    if args.stream and (args.only or args.skip or args.resume):
+        parser.error("--stream always runs every stage; it cannot be combined with --only/--skip/--resume")
+
+    if args.list:
+        for s in STAGES:
+            print(f"{s.name:20} after: {', '.join(s.after) or '-'}")
+        return 0
+
+    selected = set(args.only or STAGE_NAMES) - set(args.skip)
+    done = []
+    if args.resume:
+        checkpoint = load_checkpoint()
+        if not checkpoint["finished"]:
+            done = [name for name in checkpoint["done"] if name in selected]
+            if done:
+                print(f"Resuming; already done: {', '.join(done)}")
+
+    start = time.monotonic()
+    if args.stream:
+        failed = run(STREAM_BEFORE)
+        if not run_streaming():
+            failed.add("streaming")
+        failed |= run(STREAM_AFTER)
+    else:
+        failed = run(selected, done)
+    print(f"Pipeline finished in {time.monotonic() - start:.0f}s"
+          + (f"; failed: {', '.join(sorted(failed))}" if failed else "."))
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,54 +1,107 @@
-import requests
-from bs4 import BeautifulSoup, XMLParsedAsHTMLWarning
-import warnings
+import aiohttp
+import asyncio
+import ssl
 import json
 import re
-import time
+import hashlib
+from contextlib import aclosing
 from urllib.parse import urljoin, urlparse
 
-warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-
-INPUT_FILE = "found_links.txt"
+from channel import Channel
+from content_store import ContentStore, body_hash
+from http_cache import HTTPCache
+from link_extractor import extract_links
+from link_store import LinkStore
+from m3u_parser import M3UParser
+from robots_cache import RobotsCache
+from visited_store import VisitedStore
+
+LINKS_DB = "links.db"       # input: links found by crawler.py
+STAGE = "expander"          # this stage's cursor in the link store
 OUTPUT_FILE = "expanded_links.txt"
-VISITED_FILE = "expander_visited.json"
+CHANNELS_FILE = "expanded_channels.m3u"  # stream entries with their EXTINF metadata, read by tester.py
+VISITED_DB = "expander_visited.db"
+LEGACY_VISITED_FILE = "expander_visited.json"
 
+MAX_REVISITS = 2000        # due revisits added to each run's start links
 MAX_DEPTH = 2             # Prevent infinite recursion
 MAX_FILE_SIZE = 5_000_000 # 5 MB safety limit
+MAX_PLAYLIST_SIZE = 20_000_000  # streamed playlists are read up to this many bytes
+PLAYLIST_TIMEOUT = 60     # seconds per streamed playlist, whole download
 TIMEOUT = 10
-
-# Load visited
-try:
-    with open(VISITED_FILE, "r") as f:
-        visited = json.load(f)
-except FileNotFoundError:
-    visited = {}
-
-def safe_get(url):
-    """Download with safety, timeouts, size limits."""
-    try:
-        r = requests.get(url, timeout=TIMEOUT, stream=True)
-
-        total = 0
-        content = []
-        for chunk in r.iter_content(4096):
-            total += len(chunk)
-            if total > MAX_FILE_SIZE:
-                print(f"⚠️ Skipping large file: {url}")
-                return ""
-            content.append(chunk)
-
-        return b"".join(content).decode(errors="ignore")
-
-    except:
+WORKERS = 32              # fetches in flight at once
+PER_HOST_CONNECTIONS = 4
+RESPECT_ROBOTS = True     # for pages; playlist URLs are fetched as found (robots_cache.py)
+
+async def safe_get(session, url):
+    """Download with safety, timeouts, size limits (revalidated via the HTTP cache)."""
+    content_type, body = await cache.get_async(session, url, max_size=MAX_FILE_SIZE)
+    if body is None:
+        if content_type is not None:
+            print(f"⚠️ Skipping large file: {url}")
         return ""
-
-def normalize_url(base, link):
-    """Turn relative links into absolute ones."""
-    return urljoin(base, link)
-
-def extract_from_m3u(text):
-    """Extract all raw stream URLs inside M3U content."""
-    return re.findall(r"(https?://[^\s\"'>]+\.m3u8?)", text)
+    return body.decode(errors="ignore")
+
+def is_playlist_type(content_type):
+    """False for responses that are surely no M3U text: HTML pages and media streams."""
+    content_type = content_type.lower()
+    if "mpegurl" in content_type:
+        return True
+    return not ("html" in content_type or content_type.startswith("video/") or "mp2t" in content_type)
+
+def playlist_channels(url, records):
+    """{url: Channel} for the http entries among parsed (attrs, url) records."""
+    found = {}
+    for attrs, link in records:
+        if link.startswith("http") and link not in found:
+            found[link] = Channel.from_entry(attrs, link, source=url)
+    return found
+
+def parse_m3u_text(url, text):
+    """Like stream_m3u(), for a playlist body already downloaded."""
+    parser = M3UParser(base_url=url)
+    records = parser.feed(text.encode("utf-8")) + parser.close()
+    return {url: Channel.bare(url, source=url)} if parser.hls else playlist_channels(url, records)
+
+async def stream_m3u(session, url):
+    """
+    Stream an M3U playlist through the incremental parser and return its
+    entries as {url: Channel}. Nothing is buffered; reading stops after
+    MAX_PLAYLIST_SIZE bytes (the caller bounds the time), and at once if the
+    body does not start with #EXTM3U. An HLS playlist is one stream, not a
+    list of channels: at its first #EXT-X- tag reading stops and the
+    playlist URL itself is returned.
+    """
+    found = {}
+    parser = M3UParser(base_url=url)
+    head = b""  # start of the body until #EXTM3U is confirmed, then None
+    size = 0
+
+    def add(records):
+        for link, ch in playlist_channels(url, records).items():
+            found.setdefault(link, ch)
+
+    async with aclosing(cache.iter_body_async(session, url, accept=is_playlist_type)) as chunks:
+        async for chunk in chunks:
+            if head is not None:
+                head = (head + chunk).lstrip(b"\xef\xbb\xbf \t\r\n")
+                if len(head) >= len(b"#EXTM3U"):
+                    if not head.startswith(b"#EXTM3U"):
+                        return {}
+                    head = None
+            size += len(chunk)
+            if size > MAX_PLAYLIST_SIZE:
+                print(f"⚠️ Playlist cut at {MAX_PLAYLIST_SIZE} bytes: {url}")
+                break
+            records = parser.feed(chunk)
+            if parser.hls:
+                return {url: Channel.bare(url, source=url)}
+            add(records)
+        else:
+            add(parser.close())
+    if head is not None:
+        return {}  # ended before #EXTM3U
+    return {url: Channel.bare(url, source=url)} if parser.hls else found
 
 def extract_from_xml(text):
     """Extract URLs inside XML IPTV structures."""
@@ -65,19 +118,9 @@ def extract_from_xml(text):
     return links
 
 def extract_from_html(base_url, html):
-    """Extract all hyperlinks + inline m3u8 links."""
-    soup = BeautifulSoup(html, "html.parser")
-
-    links = []
-
-    # All <a href="...">
-    for a in soup.find_all("a", href=True):
-        links.append(normalize_url(base_url, a["href"]))
-
-    # Extract m3u/m3u8 inside ANY script/style/text
-    links += re.findall(r"(https?://[^\s\"'>]+\.m3u8?)", html)
-
-    return links
+    """Extract all hyperlinks + inline m3u8 links, in one pass (link_extractor.py)."""
+    anchors, streams = extract_links(base_url, html)
+    return anchors + streams
 
 def determine_type(url):
     """Decide file type by extension or content-type."""
@@ -93,20 +136,8 @@ def determine_type(url):
 
     return "unknown"
 
-def recursive_extract(url, depth=0):
-    if depth > MAX_DEPTH:
-        return []
-
-    if url in visited:
-        return []
-
-    visited[url] = time.time()
-
-    print(f"→ Fetching: {url}")
-    text = safe_get(url)
-    if not text:
-        return []
-
+def extract(url, text):
+    """All links found in one fetched document, by file type."""
     filetype = determine_type(url)
     found = set()
 
@@ -114,10 +145,6 @@ def recursive_extract(url, depth=0):
     if filetype == "xml":
         found.update(extract_from_xml(text))
 
-    # M3U
-    elif filetype == "m3u":
-        found.update(extract_from_m3u(text))
-
     # JSON (very rare, but sometimes contains lists)
     elif filetype == "json":
         try:
@@ -135,41 +162,199 @@ def recursive_extract(url, depth=0):
     else:
         found.update(extract_from_html(url, text))
 
-    # Recursively expand nested playlists
-    final_links = set(found)
+    return found
+
+def content_key(url, text):
+    """Body hash to reuse extracted links by; HTML links resolve against the page's directory."""
+    if determine_type(url) in ("xml", "json", "txt"):
+        return body_hash(text)
+    return body_hash(urljoin(url, ".") + "\n" + text)
 
-    for link in list(found):
-        if link.endswith(".m3u") or link.endswith(".m3u8") or link.endswith(".xml"):
-            nested = recursive_extract(link, depth + 1)
-            final_links.update(nested)
+def is_nested(link):
+    return link.endswith(".m3u") or link.endswith(".m3u8") or link.endswith(".xml")
 
-    return list(final_links)
+def is_stream(link):
+    return link.endswith(".m3u") or link.endswith(".m3u8")
 
 # ==============================
-# MAIN PROCESS
+# BREADTH-FIRST EXPANSION
 # ==============================
-
-try:
-    with open(INPUT_FILE, "r") as f:
-        start_links = list(set(line.strip() for line in f if line.strip()))
-except:
-    start_links = []
+# A queue of (url, depth) tasks drained by WORKERS coroutines. `scheduled`
+# holds every URL queued this run, so a nested playlist referenced from many
+# places is fetched once, never twice concurrently.
 
 all_results = set()
+scheduled = set()
+written = {}  # url -> whether the record written for it had metadata
+# visited, cache, links, robots and contents are opened by prepare()
+
+# pipeline.py --stream sets this to an async callable taking a Channel; every
+# channel record written is also handed to it (it waits when tester falls behind)
+stream_sink = None
+
+def write_channel(ch, channels_out):
+    """Returns False if an equal or better record was already written."""
+    # a later record with metadata supersedes a bare one (tester.py merges by URL)
+    if ch.url in written and (written[ch.url] or not ch.has_meta):
+        return False
+    written[ch.url] = ch.has_meta
+    channels_out.write(f"{ch.extinf()}\n{ch.url}\n")
+    return True
+
+async def expand_one(session, tasks, url, depth, out, channels_out):
+    if not visited.is_due(url):
+        return
 
-for url in start_links:
-    extracted = recursive_extract(url)
-    all_results.update(extracted)
+    print(f"→ Fetching: {url}")
+    if determine_type(url) == "m3u":
+        try:
+            entries = await asyncio.wait_for(stream_m3u(session, url), PLAYLIST_TIMEOUT)
+        except Exception:
+            entries = {}
+        if not entries:
+            visited.record(url, ok=False)
+            return
+        found = set(entries)
+        channels = entries.values()
+    else:
+        if RESPECT_ROBOTS and not await robots.allowed(session, url):
+            visited.record(url, ok=False)
+            return
+        text = await safe_get(session, url)
+        if not text:
+            visited.record(url, ok=False)
+            return
+        if text.lstrip("\ufeff \t\r\n").startswith("#EXTM3U"):
+            # a playlist without a .m3u name (pastebin raw, get.php?type=m3u):
+            # keep its EXTINF metadata like a streamed one
+            entries = await asyncio.to_thread(parse_m3u_text, url, text)
+            found = set(entries)
+            channels = entries.values()
+        else:
+            body = content_key(url, text)
+            found = contents.links(body)
+            if found is None:
+                # parsing is CPU-bound; keep it off the event loop
+                found = await asyncio.to_thread(extract, url, text)
+                contents.add_body(body, found)
+            found = set(found)
+            channels = [Channel.bare(link, source=url) for link in found if is_stream(link)]
+
+    # an unchanged result set pushes the next revisit further out
+    digest = hashlib.sha1("\n".join(sorted(found)).encode()).hexdigest()[:16]
+    visited.record(url, digest)
+
+    # a mirror of a document expanded at this depth or shallower: its nested
+    # playlists were queued from the first copy. Its channels are still
+    # written, as its EXTINF metadata may be better (write_channel keeps the best)
+    mirror = bool(found) and contents.is_mirror(url, found, depth)
+
+    # Written as they are found, so a killed run keeps what it expanded
+    for link in found:
+        if link not in all_results:
+            all_results.add(link)
+            out.write(link + "\n")
+    written_now = [ch for ch in channels if write_channel(ch, channels_out)]
+    out.flush()
+    channels_out.flush()
+    if stream_sink is not None:
+        for ch in written_now:
+            await stream_sink(ch)
+
+    # Queue nested playlists one level deeper
+    if depth < MAX_DEPTH and not mirror:
+        for link in found:
+            if is_nested(link) and link not in scheduled:
+                scheduled.add(link)
+                tasks.put_nowait((link, depth + 1))
+
+async def worker(session, tasks, out, channels_out):
+    while True:
+        url, depth = await tasks.get()
+        try:
+            await expand_one(session, tasks, url, depth, out, channels_out)
+        except Exception as e:
+            print(f"Expand error on {url}: {e}")
+        finally:
+            tasks.task_done()
+
+async def expand_all(start_links, out, channels_out):
+    tasks = asyncio.Queue()
+    for url in start_links:
+        if url not in scheduled:
+            scheduled.add(url)
+            tasks.put_nowait((url, 0))
+
+    connector = aiohttp.TCPConnector(
+        limit=WORKERS, limit_per_host=PER_HOST_CONNECTIONS, ssl=ssl.create_default_context()
+    )
+    timeout = aiohttp.ClientTimeout(sock_connect=TIMEOUT, sock_read=TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        workers = [
+            asyncio.create_task(worker(session, tasks, out, channels_out))
+            for _ in range(WORKERS)
+        ]
+        await tasks.join()
+        for w in workers:
+            w.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
 
-# Save visited
-with open(VISITED_FILE, "w") as f:
-    json.dump(visited, f, indent=2)
+# ==============================
+# MAIN PROCESS
+# ==============================
 
-# Save results
-with open(OUTPUT_FILE, "w") as f:
-    for link in sorted(all_results):
-        f.write(link + "\n")
+def prepare(link_store=None, http_cache=None):
+    """Open the stores (pass shared ones in); returns this run's start links."""
+    global visited, cache, links, new_links, robots, contents, own
+
+    # Load visited (migrates expander_visited.json on first run)
+    visited = VisitedStore(VISITED_DB, LEGACY_VISITED_FILE)
+    cache = http_cache if http_cache is not None else HTTPCache()
+    links = link_store if link_store is not None else LinkStore(LINKS_DB)
+    robots = RobotsCache()
+    contents = ContentStore()
+    own = [visited, contents] + [store for store, shared in ((cache, http_cache), (links, link_store)) if shared is None]
+    all_results.clear()
+    scheduled.clear()
+    written.clear()
+
+    # Links that arrived since the last run, plus earlier ones whose revisit is due
+    new_links = links.unprocessed(STAGE)
+    start_links = [url for _, url in new_links] + visited.due(MAX_REVISITS)
+    print(f"{len(new_links)} new links, {len(start_links) - len(new_links)} revisits.")
+    return start_links
+
+async def expand(start_links):
+    with open(OUTPUT_FILE, "w") as out, open(CHANNELS_FILE, "w", encoding="utf8") as channels_out:
+        channels_out.write("#EXTM3U\n")
+        await expand_all(start_links, out, channels_out)
+
+def finish(finished=True):
+    """Commit and close; a run that did not finish keeps the link cursor where it was."""
+    if finished and new_links:
+        links.mark_processed(STAGE, new_links[-1][0])
+    # stores passed in by the caller are only committed; the caller closes them
+    for store in (links, visited, cache, contents):
+        if store in own:
+            store.close()
+        else:
+            store.commit()
+    robots.close()
+
+    print(f"\n=== DONE ===")
+    print(f"Found total {len(all_results)} stream URLs.")
+    print(f"Saved to {OUTPUT_FILE}, channel records to {CHANNELS_FILE}")
+    print(f"HTTP cache: {cache.hits} not modified, {cache.misses} downloaded.")
+    print(f"Content store: {contents.reused} bodies reused, {contents.mirrors} mirrors skipped.")
+
+def main():
+    start_links = prepare()
+    finished = False
+    try:
+        asyncio.run(expand(start_links))
+        finished = True
+    finally:
+        finish(finished)
 
-print(f"\n=== DONE ===")
-print(f"Found total {len(all_results)} stream URLs.")
-print(f"Saved to {OUTPUT_FILE}")
+if __name__ == "__main__":
+    main()
@@ -1,137 +1,333 @@
-import json, re, requests
+# repo_scanner.py
+# Finds playlists on public code hosts and queues them for crawler.py.
+#
+# The sources (GitHub and GitLab code search, Codeberg repository search) run
+# concurrently, and each query pages through its results by the Link header,
+# up to MAX_PAGES. Every API call goes through APIClient. It honours
+# Retry-After and X-RateLimit-Remaining/-Reset: a short wait is slept out, and
+# a longer one stops that source until the next run.
+#
+# Runs are incremental. Every result already handled is remembered in
+# STATE_DB under a key that changes with its content (blob sha, a hash of the
+# matched text, or the repository's updated_at). Only new keys are queued, and
+# a source whose results really come newest first (Codeberg's sort=updated)
+# stops paging at the first page with nothing new; the code searches return
+# best-match order, so they always page to MAX_PAGES. The text of each new
+# result is also scanned for stream, pastebin and telegra.ph links.
+#
+# Sources take their API base URL, so a run can be pointed at a local stub
+# server: main(sources=[GitHubSource("http://127.0.0.1:8000")]).
+
+import asyncio
+import hashlib
+import os
+import re
+import time
+from urllib.parse import quote
+
+import aiohttp
+
+from common import SQLiteStore
+from frontier import Frontier
+from link_extractor import find_streams
+
+queue = None  # set by main()
 
-QUEUE_FILE = "queue.json"
+HEADERS = {"User-Agent": "Mozilla/5.0"}
 
-with open(QUEUE_FILE, "r", encoding="utf-8") as f:
-    queue = set(json.load(f))
+STATE_DB = os.path.join(".cache", "repo_scanner.db")
+COMMIT_EVERY = 200
 
-HEADERS = {"User-Agent": "Mozilla/5.0"}
+MAX_PAGES = 10         # result pages per query
+PER_PAGE = 100
+TIMEOUT = 20
+RETRIES = 2            # after a rate-limited response
+MAX_WAIT = 120         # longest rate-limit wait; beyond it the source stops for this run
+MAX_RUNTIME = 900
+
+GITHUB_TOKEN = os.environ.get("GITHUB_TOKEN")
+GITLAB_TOKEN = os.environ.get("GITLAB_TOKEN")
 
 # ------------------------
 # Sources to search
 # ------------------------
 
-GITHUB_SEARCH = [
-    "https://api.github.com/search/code?q=.m3u+in:file+language:text",
-    "https://api.github.com/search/code?q=.m3u8+in:file+language:text"
-]
-
-GITLAB_SEARCH = [
-    "https://gitlab.com/api/v4/search?scope=blobs&search=.m3u",
-    "https://gitlab.com/api/v4/search?scope=blobs&search=.m3u8"
-]
+GITHUB_QUERIES = [".m3u in:file language:text", ".m3u8 in:file language:text"]
+GITLAB_QUERIES = [".m3u", ".m3u8"]
+CODEBERG_QUERIES = ["m3u"]
 
 PASTEBIN_RAW = "https://pastebin.com/raw/{}"
-PASTE_REGEX = r"pastebin\.com/([A-Za-z0-9]+)"
-
-TELEGRAPH_REGEX = r"https://telegra\.ph/[^ \"']+"
-CODEBERG_SEARCH = "https://codeberg.org/api/v1/repos/search?topic=m3u"
-
-# -----------------------------------
-# Helper: Add found URLs to queue
-# -----------------------------------
-
-def add_url(url):
-    if ".m3u" in url or ".m3u8" in url:
-        queue.add(url)
+PASTE_REGEX = r"pastebin\.com/(?:raw/)?([A-Za-z0-9]+)"
 
+TELEGRAPH_REGEX = r"https://telegra\.ph/[^ \"'<>)\]]+"
 
 # -----------------------------
-# GitHub scanning
+# Links inside result text
 # -----------------------------
 
-def scan_github():
-    for url in GITHUB_SEARCH:
-        try:
-            r = requests.get(url, headers=HEADERS, timeout=10)
-            data = r.json()
+def scan_pastebin(page_text):
+    return [PASTEBIN_RAW.format(code) for code in re.findall(PASTE_REGEX, page_text)]
 
-            if "items" in data:
-                for item in data["items"]:
-                    if "html_url" in item:
-                        raw = item["html_url"].replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
-                        add_url(raw)
+def scan_telegraph(page_text):
+    return re.findall(TELEGRAPH_REGEX, page_text)
 
-        except:
-            pass
+def scan_text(text):
+    """Stream, pastebin (as raw) and telegra.ph links in a blob or snippet."""
+    return find_streams(text) + scan_pastebin(text) + scan_telegraph(text)
 
+def add_result(urls, text):
+    """Queue a new result and the links in its text; returns how many were new."""
+    return sum(queue.push(url) for url in dict.fromkeys(urls + scan_text(text or "")))
 
 # -----------------------------
-# GitLab scanning
+# Seen results
 # -----------------------------
 
-def scan_gitlab():
-    for url in GITLAB_SEARCH:
-        try:
-            r = requests.get(url, headers=HEADERS, timeout=10)
-            data = r.json()
-
-            for item in data:
-                if "url" in item:
-                    add_url(item["url"])
-
-        except:
-            pass
-
+class ScanState(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=STATE_DB):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS seen ("
+            " source TEXT NOT NULL,"
+            " key TEXT NOT NULL,"
+            " first_seen REAL NOT NULL,"
+            " PRIMARY KEY (source, key)) WITHOUT ROWID"
+        )
+
+    def is_new(self, source, key):
+        """Record key for source; True if it was not seen before."""
+        cur = self.db.execute(
+            "INSERT OR IGNORE INTO seen (source, key, first_seen) VALUES (?, ?, ?)",
+            (source, key, time.time()),
+        )
+        if not cur.rowcount:
+            return False
+        self._wrote()
+        return True
 
 # -----------------------------
-# Codeberg
+# Rate-limited API client
 # -----------------------------
 
-def scan_codeberg():
-    try:
-        r = requests.get(CODEBERG_SEARCH, timeout=10, headers=HEADERS)
-        data = r.json()
-
-        for repo in data.get("data", []):
-            if "html_url" in repo:
-                add_url(repo["html_url"])
-
-    except:
-        pass
-
+class RateLimited(Exception):
+    """The source's quota is empty for longer than MAX_WAIT."""
+
+
+class APIClient:
+    def __init__(self, session, headers=None):
+        self.session = session
+        self.headers = {**HEADERS, **(headers or {})}
+        self.resume_at = 0.0  # no requests before this (time.time())
+        self.requests = 0
+
+    def _note_quota(self, status, headers):
+        now = time.time()
+        retry = headers.get("Retry-After", "")
+        if status in (403, 429) and retry.isdigit():
+            self.resume_at = max(self.resume_at, now + int(retry))
+        remaining = headers.get("X-RateLimit-Remaining", headers.get("RateLimit-Remaining"))
+        reset = headers.get("X-RateLimit-Reset", headers.get("RateLimit-Reset", ""))
+        if remaining == "0" and reset.isdigit():
+            # epoch seconds (GitHub, GitLab) or seconds from now
+            reset = int(reset)
+            self.resume_at = max(self.resume_at, reset if reset > 1e9 else now + reset)
+
+    async def get(self, url, params=None):
+        """(json, next page URL) of one API call; json is None on failure."""
+        for _ in range(RETRIES + 1):
+            delay = self.resume_at - time.time()
+            if delay > MAX_WAIT:
+                raise RateLimited(f"quota resets in {delay:.0f}s")
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self.requests += 1
+            try:
+                async with self.session.get(
+                    url, params=params, headers=self.headers,
+                    timeout=aiohttp.ClientTimeout(total=TIMEOUT),
+                ) as r:
+                    self._note_quota(r.status, r.headers)
+                    if r.status in (403, 429) and self.resume_at > time.time():
+                        continue  # rate limited; wait and retry
+                    if r.status != 200:
+                        return None, None
+                    data = await r.json(content_type=None)
+                    nxt = r.links.get("next")
+                    return data, (str(nxt["url"]) if nxt else None)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                return None, None
+        return None, None
 
 # -----------------------------
-# Extract Pastebin URLs & convert to raw
+# Sources
 # -----------------------------
 
-def scan_pastebin(page_text):
-    matches = re.findall(PASTE_REGEX, page_text)
-    for code in matches:
-        raw_url = PASTEBIN_RAW.format(code)
-        add_url(raw_url)
-
-
-# -----------------------------
-# Telegraph scanning
-# -----------------------------
+class Source:
+    name = None
+    newest_first = False  # results sorted by recency: stop at a page with nothing new
+
+    def __init__(self, api, queries, token=None):
+        self.api = api.rstrip("/")
+        self.queries = queries
+        self.token = token
+
+    def headers(self):
+        return {"Authorization": f"Bearer {self.token}"} if self.token else {}
+
+    def first_page(self, query):
+        """(url, params) of the first results page for query."""
+        raise NotImplementedError
+
+    def results(self, data):
+        """(key, urls to queue, text to scan) for each result in a page."""
+        raise NotImplementedError
+
+    async def scan_query(self, client, state, query):
+        url, params = self.first_page(query)
+        added = 0
+        for _ in range(MAX_PAGES):
+            data, url = await client.get(url, params)
+            params = None  # the next link carries the query
+            if data is None:
+                break
+            fresh = 0
+            for key, urls, text in self.results(data):
+                if state.is_new(self.name, key):
+                    fresh += 1
+                    added += add_result(urls, text)
+            if url is None or (self.newest_first and not fresh):
+                break
+        return added
+
+    async def scan(self, session, state):
+        """Run every query concurrently; returns the number of URLs queued."""
+        client = APIClient(session, self.headers())
+        # a query that fails or runs out of quota keeps what the others queued
+        results = await asyncio.gather(
+            *(self.scan_query(client, state, q) for q in self.queries), return_exceptions=True
+        )
+        added = 0
+        for query, result in zip(self.queries, results):
+            if isinstance(result, RateLimited):
+                print(f"{self.name}: {query!r} rate limited ({result}); continuing next run.")
+            elif isinstance(result, BaseException):
+                print(f"{self.name}: {query!r} failed: {result!r}")
+            else:
+                added += result
+        print(f"{self.name}: {client.requests} API requests.")
+        return added
+
+
+class GitHubSource(Source):
+    name = "github"
+    # sort=indexed is being retired; results come in best-match order, so
+    # a page of seen results says nothing about the pages after it
+
+    def __init__(self, api="https://api.github.com", queries=GITHUB_QUERIES, token=GITHUB_TOKEN):
+        super().__init__(api, queries, token)
+
+    def headers(self):
+        # text-match fragments give us part of each file to scan
+        return {**super().headers(), "Accept": "application/vnd.github.text-match+json"}
+
+    def first_page(self, query):
+        return self.api + "/search/code", {"q": query, "per_page": PER_PAGE}
+
+    def results(self, data):
+        for item in data.get("items", []):
+            if "html_url" not in item:
+                continue
+            raw = item["html_url"].replace("github.com", "raw.githubusercontent.com").replace("/blob/", "/")
+            text = "\n".join(m.get("fragment", "") for m in item.get("text_matches", []))
+            yield item.get("sha") or item["html_url"], [raw], text
+
+
+class GitLabSource(Source):
+    name = "gitlab"
+
+    def __init__(self, api="https://gitlab.com/api/v4", queries=GITLAB_QUERIES, token=GITLAB_TOKEN):
+        super().__init__(api, queries, token)
+
+    def first_page(self, query):
+        return self.api + "/search", {"scope": "blobs", "search": query, "per_page": PER_PAGE}
+
+    def results(self, data):
+        for item in data if isinstance(data, list) else []:
+            if "project_id" not in item or "path" not in item:
+                continue
+            text = item.get("data") or ""
+            key = f"{item['project_id']}/{item['path']}:" + hashlib.sha1(text.encode()).hexdigest()[:16]
+            raw = (f"{self.api}/projects/{item['project_id']}/repository/files/"
+                   f"{quote(item['path'], safe='')}/raw?ref={quote(item.get('ref') or 'HEAD', safe='')}")
+            yield key, [raw], text
+
+
+class CodebergSource(Source):
+    name = "codeberg"
+    newest_first = True
+
+    def __init__(self, api="https://codeberg.org/api/v1", queries=CODEBERG_QUERIES, token=None):
+        super().__init__(api, queries, token)
+
+    def first_page(self, query):
+        return self.api + "/repos/search", {
+            "q": query, "topic": "true", "sort": "updated", "order": "desc", "limit": 50,
+        }
+
+    def results(self, data):
+        for repo in data.get("data", []) if isinstance(data, dict) else []:
+            if "html_url" in repo:
+                # the repository page; crawler.py follows it to the playlist files
+                yield f"{repo['html_url']}@{repo.get('updated_at', '')}", [repo["html_url"]], repo.get("description") or ""
 
-def scan_telegraph(page_text):
-    matches = re.findall(TELEGRAPH_REGEX, page_text)
-    for link in matches:
-        add_url(link)
 
+def default_sources():
+    return [GitHubSource(), GitLabSource(), CodebergSource()]
 
 # -----------------------------
 # Run scanners
 # -----------------------------
 
-print("Scanning GitHub...")
-scan_github()
-
-print("Scanning GitLab...")
-scan_gitlab()
-
-print("Scanning Codeberg...")
-scan_codeberg()
-
-# No direct crawler here — crawler.py will fetch the page content
-
-# --------------------------------------
-# SAVE QUEUE
-# --------------------------------------
-
-with open(QUEUE_FILE, "w", encoding="utf-8") as f:
-    json.dump(list(queue), f, ensure_ascii=False, indent=2)
-
-print("Repo scanner added:", len(queue), "total URLs in queue now.")
+async def scan_all(sources, state):
+    async with aiohttp.ClientSession() as session:
+        jobs = {asyncio.ensure_future(s.scan(session, state)): s for s in sources}
+        done, unfinished = await asyncio.wait(jobs, timeout=MAX_RUNTIME)
+        for job in unfinished:
+            job.cancel()
+            print(f"{jobs[job].name}: stopped after {MAX_RUNTIME}s.")
+        for job in done:
+            if job.exception() is None:
+                print(f"{jobs[job].name}: queued {job.result()} URLs.")
+            else:
+                print(f"{jobs[job].name}: failed: {job.exception()!r}")
+
+def main(frontier=None, sources=None):
+    """Run every scanner; pass `frontier` to share an open one, `sources` to replace the defaults."""
+    global queue
+    queue = frontier if frontier is not None else Frontier()
+    sources = sources if sources is not None else default_sources()
+
+    state = ScanState()
+    try:
+        print("Scanning", ", ".join(s.name for s in sources), "...")
+        if sources:
+            asyncio.run(scan_all(sources, state))
+    finally:
+        state.close()
+
+    # No direct crawler here — crawler.py will fetch the page content
+
+    # --------------------------------------
+    # SAVE QUEUE
+    # --------------------------------------
+
+    print("Repo scanner added:", len(queue), "total URLs in queue now.")
+    if frontier is None:
+        queue.close()
+    else:
+        queue.commit()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+# robots_cache.py
+# Non-blocking robots.txt checks shared by crawler.py, recursive_expander.py
+# and search_engine_scraper.py.
+#
+# robots.txt is fetched on the caller's aiohttp session, so a new domain no
+# longer stalls the event loop the way RobotFileParser.read() did. Lookups
+# are single-flight: coroutines asking about the same origin at once all wait
+# on one fetch. Results are kept in a small SQLite file under .cache (restored
+# between CI runs) for TTL seconds, and parsed rules are kept in memory for
+# the rest of the run.
+#
+# Status handling follows the usual convention: 401/403 disallow the whole
+# site, any other 4xx allows it, and 5xx or a network error allows it but is
+# asked again after ERROR_TTL instead of TTL.
+
+import asyncio
+import os
+import sqlite3
+import time
+from urllib.parse import urlsplit
+from urllib.robotparser import RobotFileParser
+
+import aiohttp
+
+ROBOTS_DB = os.path.join(".cache", "robots.db")
+TTL = 24 * 3600
+ERROR_TTL = 3600
+MAX_SIZE = 512 * 1024  # bytes of robots.txt that are parsed
+TIMEOUT = 10
+USER_AGENT = "*"
+
+
+def origin_of(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+def make_parser(status, body):
+    rp = RobotFileParser()
+    if status in (401, 403):
+        rp.disallow_all = True
+    elif status == 200:
+        rp.parse(body.splitlines())
+    else:
+        rp.allow_all = True
+    return rp
+
+
+class RobotsCache:
+    def __init__(self, path=ROBOTS_DB, user_agent=USER_AGENT):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # autocommit: several stores may write this file from one thread, and
+        # a write never stays open across an await
+        self.db = sqlite3.connect(path, isolation_level=None)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS robots ("
+            " origin TEXT PRIMARY KEY,"
+            " status INTEGER NOT NULL,"
+            " body TEXT NOT NULL,"
+            " expires REAL NOT NULL)"
+        )
+        self.user_agent = user_agent
+        self.parsers = {}   # origin -> (RobotFileParser, expires)
+        self.inflight = {}  # origin -> fetch task shared by concurrent callers
+        self.fetched = 0
+
+    def _load(self, origin, now):
+        row = self.db.execute(
+            "SELECT status, body, expires FROM robots WHERE origin = ? AND expires > ?",
+            (origin, now),
+        ).fetchone()
+        if row is None:
+            return None
+        rp = make_parser(row[0], row[1])
+        self.parsers[origin] = (rp, row[2])
+        return rp
+
+    async def _fetch(self, session, origin):
+        try:
+            async with session.get(
+                origin + "/robots.txt", timeout=aiohttp.ClientTimeout(total=TIMEOUT)
+            ) as r:
+                status = r.status
+                body = ""
+                if status == 200:
+                    chunks, total = [], 0
+                    async for chunk in r.content.iter_chunked(16384):
+                        chunks.append(chunk)
+                        total += len(chunk)
+                        if total >= MAX_SIZE:
+                            break
+                    body = b"".join(chunks)[:MAX_SIZE].decode("utf-8", errors="ignore")
+        except Exception:
+            status, body = 0, ""
+        self.fetched += 1
+        expires = time.time() + (TTL if 0 < status < 500 else ERROR_TTL)
+        self.db.execute(
+            "INSERT OR REPLACE INTO robots (origin, status, body, expires) VALUES (?, ?, ?, ?)",
+            (origin, status, body, expires),
+        )
+        rp = make_parser(status, body)
+        self.parsers[origin] = (rp, expires)
+        return rp
+
+    async def rules(self, session, url):
+        """The parsed robots.txt for url's origin."""
+        origin = origin_of(url)
+        now = time.time()
+        cached = self.parsers.get(origin)
+        if cached and cached[1] > now:
+            return cached[0]
+        rp = self._load(origin, now)
+        if rp is not None:
+            return rp
+        task = self.inflight.get(origin)
+        if task is None:
+            task = self.inflight[origin] = asyncio.ensure_future(self._fetch(session, origin))
+            task.add_done_callback(lambda _: self.inflight.pop(origin, None))
+        # one cancelled caller must not cancel the fetch the others wait on
+        return await asyncio.shield(task)
+
+    async def allowed(self, session, url, user_agent=None):
+        rp = await self.rules(session, url)
+        try:
+            return rp.can_fetch(user_agent or self.user_agent, url)
+        except Exception:
+            return True
+
+    def close(self):
+        self.db.execute("DELETE FROM robots WHERE expires < ?", (time.time() - TTL,))
+        self.db.close()
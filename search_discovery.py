@@ -0,0 +1,261 @@
+# search_discovery.py
+# Search-engine discovery shared by search_crawler.py and
+# search_engine_scraper.py. It replaces their blocking keyword x engine loops
+# and the Google query URLs crawler.py used to push into the frontier.
+#
+# Every (query, engine) pair is a job, and all jobs run at once on one aiohttp
+# session. Each engine draws from its own token bucket (RATE requests per
+# second after a burst of BURST), so adding queries makes a run longer rather
+# than getting us throttled. A 429/503 drains the bucket for BACKOFF seconds.
+# Result pagination is followed up to MAX_PAGES deep through the engine's
+# offset parameter, and stops at the first page that adds no new links.
+# Whatever is still waiting for a token after MAX_RUNTIME is dropped.
+#
+# Parsed result pages are cached per (engine, query, page) in RESULTS_DB for
+# RESULT_TTL. An identical query within that window costs no request, so the
+# 6-hourly workflow no longer repeats every search. Failed fetches are not
+# cached.
+
+import asyncio
+import json
+import os
+import time
+from collections import namedtuple
+from urllib.parse import parse_qs, urlencode, urlsplit
+
+import aiohttp
+
+from common import SQLiteStore
+from link_extractor import extract_links
+
+RESULTS_DB = os.path.join(".cache", "search.db")
+RESULT_TTL = 24 * 3600
+COMMIT_EVERY = 50
+
+MAX_PAGES = 3          # result pages per query and engine
+MAX_CONNECTIONS = 30
+REQUEST_TIMEOUT = 12
+BACKOFF = 60           # seconds an engine rests after 429/503
+MAX_RUNTIME = 600      # searches still waiting for a token then are left for the next run
+MAX_LINK_LENGTH = 200
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 "
+                  "(KHTML, like Gecko) Chrome/115.0 Safari/537.36"
+}
+
+# name, search URL, query parameter, paging parameter, its value on the
+# second page and the step per page after that, requests/s, burst
+Engine = namedtuple("Engine", "name url param page_param page_start page_step rate burst")
+
+ENGINES = [
+    Engine("duckduckgo", "https://html.duckduckgo.com/html/", "q", "s", 30, 50, 0.5, 3),
+    Engine("bing", "https://www.bing.com/search", "q", "first", 11, 10, 0.5, 3),
+    Engine("mojeek", "https://www.mojeek.com/search", "q", "s", 11, 10, 0.5, 3),
+    Engine("qwant", "https://lite.qwant.com/", "q", "p", 2, 1, 0.3, 2),
+]
+ENGINE_BY_NAME = {e.name: e for e in ENGINES}
+
+# queries crawler.py used to build from keywords.txt
+BASE_QUERIES = [
+    "bg iptv playlist",
+    "bulgaria m3u",
+    "бг m3u8",
+    "българска телевизия онлайн",
+]
+QUERY_SUFFIXES = ["iptv", "m3u", "m3u8", "bg tv", "бг тв", "бг телевизия"]
+
+
+def build_queries(keywords):
+    """BASE_QUERIES plus each keyword with every QUERY_SUFFIX, deduplicated."""
+    queries = list(BASE_QUERIES)
+    for kw in keywords:
+        queries.extend(f"{kw} {suffix}" for suffix in QUERY_SUFFIXES)
+    return list(dict.fromkeys(q.strip().lower() for q in queries if q.strip()))
+
+def page_url(engine, query, page):
+    params = {engine.param: query}
+    if page:
+        params[engine.page_param] = engine.page_start + (page - 1) * engine.page_step
+    return engine.url + "?" + urlencode(params)
+
+# -----------------------------
+# Result links
+# -----------------------------
+
+def site_of(url):
+    """Last two labels of the host: html.duckduckgo.com -> duckduckgo.com."""
+    return ".".join((urlsplit(url).hostname or "").split(".")[-2:])
+
+def unwrap(url):
+    """Target of a DuckDuckGo-style redirect link (/l/?uddg=...), else url."""
+    parts = urlsplit(url)
+    if parts.query and "uddg=" in parts.query:
+        target = parse_qs(parts.query).get("uddg")
+        if target and target[0].startswith(("http://", "https://")):
+            return target[0]
+    return url
+
+def result_links(page_url, html):
+    """Links on a results page, minus the engine's own (redirects, pagination)."""
+    engine = site_of(page_url)
+    anchors, _ = extract_links(page_url, html)
+    links = (unwrap(url) for url in anchors)
+    return list(dict.fromkeys(
+        url for url in links if len(url) < MAX_LINK_LENGTH and site_of(url) != engine
+    ))
+
+# -----------------------------
+# Rate limiting
+# -----------------------------
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.stamp = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    async def take(self):
+        # the lock queues waiters, so tokens go out in request order
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+    def penalize(self, seconds):
+        """Push the next token `seconds` into the future."""
+        self._refill()
+        self.tokens = min(self.tokens, 0) - seconds * self.rate
+
+# -----------------------------
+# Query -> results cache
+# -----------------------------
+
+class ResultCache(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path=RESULTS_DB, ttl=RESULT_TTL):
+        super().__init__(path)
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS results ("
+            " engine TEXT NOT NULL,"
+            " query TEXT NOT NULL,"
+            " page INTEGER NOT NULL,"
+            " links TEXT NOT NULL,"
+            " expires REAL NOT NULL,"
+            " PRIMARY KEY (engine, query, page)) WITHOUT ROWID"
+        )
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, engine, query, page):
+        row = self.db.execute(
+            "SELECT links FROM results WHERE engine = ? AND query = ? AND page = ? AND expires > ?",
+            (engine, query, page, time.time()),
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def put(self, engine, query, page, links):
+        self.db.execute(
+            "INSERT OR REPLACE INTO results (engine, query, page, links, expires) VALUES (?, ?, ?, ?, ?)",
+            (engine, query, page, json.dumps(links), time.time() + self.ttl),
+        )
+        self._wrote()
+
+    def close(self):
+        self.db.execute("DELETE FROM results WHERE expires < ?", (time.time(),))
+        super().close()
+
+# -----------------------------
+# Searching
+# -----------------------------
+
+async def fetch_results(session, bucket, engine, query, page):
+    """Result links of one page, or None if the engine did not answer."""
+    url = page_url(engine, query, page)
+    await bucket.take()
+    try:
+        async with session.get(
+            url, headers=HEADERS, timeout=aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+        ) as resp:
+            if resp.status in (429, 503):
+                bucket.penalize(BACKOFF)
+                return None
+            if resp.status != 200:
+                return None
+            html = await resp.text(errors="ignore")
+    except Exception:
+        return None
+    return result_links(url, html)
+
+async def search(session, buckets, cache, engine, query, found):
+    """Follow one query's result pages on one engine, adding links to `found`."""
+    seen = set()
+    for page in range(MAX_PAGES):
+        links = cache.get(engine.name, query, page)
+        if links is None:
+            links = await fetch_results(session, buckets[engine.name], engine, query, page)
+            if links is None:
+                return
+            # an empty first page is more likely a captcha than no results
+            if links or page:
+                cache.put(engine.name, query, page, links)
+        fresh = [link for link in links if link not in seen]
+        if not fresh:
+            return  # past the last page, or the engine repeats itself
+        seen.update(fresh)
+        for link in fresh:
+            found.setdefault(link, query)
+
+async def search_all(session, queries, engines=ENGINES, cache=None):
+    """
+    Run every query on every engine concurrently.
+    Returns {result url: first query that found it}, in discovery order.
+    """
+    own = cache is None
+    if own:
+        cache = ResultCache()
+    buckets = {e.name: TokenBucket(e.rate, e.burst) for e in engines}
+    found = {}
+    jobs = [
+        asyncio.ensure_future(search(session, buckets, cache, engine, query, found))
+        for query in queries for engine in engines
+    ]
+    try:
+        if jobs:
+            _, unfinished = await asyncio.wait(jobs, timeout=MAX_RUNTIME)
+            if unfinished:
+                print(f"Search: {len(unfinished)} searches left for the next run.")
+    finally:
+        for job in jobs:
+            job.cancel()
+        print(f"Search: {len(queries)} queries x {len(engines)} engines, "
+              f"{cache.hits} pages cached, {cache.misses} requested, {len(found)} links.")
+        if own:
+            cache.close()
+        else:
+            cache.commit()
+    return found
+
+async def discover_async(queries, engines=ENGINES):
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        return await search_all(session, queries, engines)
+
+def discover(queries, engines=ENGINES):
+    """Blocking form of search_all() on its own session."""
+    return asyncio.run(discover_async(queries, engines))
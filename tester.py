@@ -1,45 +1,310 @@
 import asyncio
 import aiohttp
+import json
+import os
+import signal
+import sqlite3
 import ssl
+import threading
+import time
+from collections import Counter
 
-INPUT_FILE = "found_links.txt"
+from bg_classifier import worth_testing
+from channel import Channel, read_channels, write_channels
+from common import host_of
+from health_store import HealthStore
+from hls_probe import LIST_REASON, ProbeResult, probe
+from host_budget import HostBudget, HostScheduler
+from link_store import LinkStore, normalize_url
+from m3u_parser import parse_extinf
+
+LINKS_DB = "links.db"  # input: links found by crawler.py
+STAGE = "tester"       # this stage's cursor in the link store
+CHANNELS_FILE = "expanded_channels.m3u"  # expander output, carries EXTINF metadata
 OUTPUT_FILE = "bg_playlist_temp.m3u"
+HEALTH_DB = "health.db"  # per-stream health history; the playlist is built from it
+DEAD_SAMPLE = 300        # long-dead streams retested per run, oldest check first
+REPORT_FILE = "tester_report.jsonl"  # per-URL latency / variants / failure reason
 TIMEOUT = 10
+# Deep mode parses HLS master/media playlists and range-fetches the first
+# segment instead of trusting any HTTP 200 (see hls_probe.py).
+DEEP_VALIDATION = True
+STREAM_TIMEOUT = 25  # whole-probe time budget per stream in deep mode
 MAX_CONNECTIONS = 100  # adjust as needed
+# Per-host limits start at HOST_INITIAL and adapt (AIMD) between HOST_MIN
+# and HOST_MAX from each host's latency and error rate (see host_budget.py).
+HOST_INITIAL = 4
+HOST_MIN = 1
+HOST_MAX = 32
+MAX_WAITING = 2000  # links parked for hosts at their limit
 
-# read URLs
-with open(INPUT_FILE, "r") as f:
-    urls = [line.strip() for line in f if line.strip()]
+# HTTP statuses / probe failures that mean "back off this host", not "dead stream"
+CONGESTION_STATUSES = {429, 503}
+CONGESTION_REASONS = {"timeout", "http 429", "http 503", "ClientConnectorError",
+                      "ServerDisconnectedError", "ClientOSError"}
 
-valid_links = []
+PROGRESS_INTERVAL = 30  # seconds between progress lines
+MAX_RUNTIME = 4 * 3600  # stop testing after this long and publish what we have
 
-async def test_url(session, url):
-    try:
-        async with session.get(url, timeout=TIMEOUT) as response:
-            if response.status == 200:
-                print(f"VALID: {url}")
-                valid_links.append(url)
+# Each run tests a prioritised subset instead of the whole history:
+#   - links that arrived since the last run (link store cursor, expander output)
+#   - streams that are currently published
+#   - a rotating sample of dead ones, longest-unchecked first
+# Candidates are staged in a private on-disk SQLite table keyed by normalised
+# URL, so memory does not grow with the input. One record per URL; a record
+# with EXTINF metadata wins over a bare link.
+#
+# links, health, staging, progress and report_out are opened by prepare().
+
+def add_channel(ch):
+    key = normalize_url(ch.url)
+    if key is None:
+        return
+    staging.execute(
+        "INSERT INTO candidates (key, url, extinf, has_meta) VALUES (?, ?, ?, ?)"
+        " ON CONFLICT(key) DO UPDATE SET url = excluded.url, extinf = excluded.extinf, has_meta = 1"
+        " WHERE excluded.has_meta AND NOT candidates.has_meta",
+        (key, ch.url, ch.extinf(), ch.has_meta),
+    )
+
+# New links and expander channels that the playlist filter would drop anyway
+# (bg_classifier.py) are not worth a connection. Retests are not filtered, so
+# already published streams still age out through the health history.
+n_skipped = 0
+
+def add_new_channel(ch):
+    global n_skipped
+    if worth_testing(ch):
+        add_channel(ch)
+    else:
+        n_skipped += 1
+
+def stage_candidates(links):
+    """Fill the staging table; returns (last new link id, number of new links)."""
+    last_link_id = links.cursor(STAGE)
+    n_new = 0
+    for link_id, url, source in links.iter_unprocessed(STAGE):
+        add_new_channel(Channel.bare(url, source=source or ""))
+        last_link_id = link_id
+        n_new += 1
+
+    if os.path.exists(CHANNELS_FILE):
+        for ch in read_channels(CHANNELS_FILE):
+            if ch.url in health:
+                health.update_meta(ch)
             else:
-                print(f"FAILED ({response.status}): {url}")
+                add_new_channel(ch)
+
+    for ch in health.retest_candidates(DEAD_SAMPLE):
+        add_channel(ch)
+    return last_link_id, n_new
+
+def candidates():
+    for url, extinf in staging.execute("SELECT url, extinf FROM candidates"):
+        yield Channel.from_entry(parse_extinf(extinf), url)
+
+# -----------------------------
+# Results: streamed to disk as they arrive, summarised periodically
+# -----------------------------
+
+class Progress:
+    """Counts results and prints one summary line every PROGRESS_INTERVAL seconds."""
+
+    def __init__(self, total):
+        self.total = total
+        self.valid = 0
+        self.failed = 0
+        self.reasons = Counter()
+        self.start = self.last_print = time.monotonic()
+
+    def add(self, ok, reason=""):
+        if ok:
+            self.valid += 1
+        else:
+            self.failed += 1
+            self.reasons[reason or "error"] += 1
+        now = time.monotonic()
+        if now - self.last_print >= PROGRESS_INTERVAL:
+            self.last_print = now
+            self.print_line()
+
+    def print_line(self):
+        done = self.valid + self.failed
+        rate = done / max(time.monotonic() - self.start, 1e-9)
+        print(f"[{done}/{self.total}] valid {self.valid}, failed {self.failed} ({rate:.1f}/s)", flush=True)
+
+    def summary(self):
+        self.print_line()
+        for reason, n in self.reasons.most_common(10):
+            print(f"  {n:6d}  {reason}")
+
+def report(ch, ok, kind, reason, latency, variants=()):
+    report_out.write(json.dumps({
+        "url": ch.url,
+        "ok": ok,
+        "kind": kind,
+        "reason": reason,
+        "latency_ms": round(latency * 1000) if latency is not None else None,
+        "variants": list(variants),
+    }) + "\n")
+    health.record(ch, ok, reason, latency)
+    progress.add(ok, reason)
+
+# Both checks return True when the host looked congested, for the scheduler.
+
+async def deep_test_url(session, ch):
+    try:
+        result = await asyncio.wait_for(probe(session, ch.url), STREAM_TIMEOUT)
+    except asyncio.TimeoutError:
+        result = ProbeResult(ch.url, False, "", "timeout", None, ())
+    report(ch, result.ok, result.kind, result.reason, result.latency, result.variants)
+    if result.reason == LIST_REASON:
+        # a playlist of channels is not published; recursive_expander.py
+        # picks it up from the link store and its channels come back to us
+        links.add(ch.url, source=ch.source or None)
+    return result.reason in CONGESTION_REASONS
+
+async def test_url(session, ch):
+    start = time.monotonic()
+    try:
+        async with session.get(ch.url, timeout=TIMEOUT) as response:
+            latency = time.monotonic() - start
+            ok = response.status == 200
+            report(ch, ok, "", "" if ok else f"http {response.status}", latency)
+            return response.status in CONGESTION_STATUSES
     except:
-        print(f"FAILED: {url}")
+        report(ch, False, "", "error", None)
+        return True
 
-async def main():
+async def test_all(items):
     # Create connector INSIDE async context
     sslcontext = ssl.create_default_context()
     conn = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, ssl=sslcontext)
 
     async with aiohttp.ClientSession(connector=conn) as session:
-        tasks = [test_url(session, url) for url in urls]
-        await asyncio.gather(*tasks)
+        check = deep_test_url if DEEP_VALIDATION else test_url
+        # links are handed out lazily; at most MAX_CONNECTIONS checks exist at once
+        budget = HostBudget(HOST_INITIAL, HOST_MIN, HOST_MAX)
+        scheduler = HostScheduler(budget, MAX_CONNECTIONS, MAX_WAITING)
+        await scheduler.run(
+            items,
+            lambda ch: host_of(ch.url),
+            lambda ch: check(session, ch),
+        )
+
+# -----------------------------
+# Stream mode (pipeline.py --stream)
+# -----------------------------
+# Discovery stages put Channels on a bounded asyncio.Queue while they run,
+# then None once they are done. Those are tested as they arrive, ahead of
+# the staged retests, with the same filters as a batch run.
+
+def take_streamed(ch):
+    global n_skipped
+    key = normalize_url(ch.url)
+    if key is None:
+        return False
+    if ch.url in health:
+        health.update_meta(ch)
+        return False
+    if not worth_testing(ch):
+        n_skipped += 1
+        return False
+    if staging.execute("SELECT 1 FROM candidates WHERE key = ?", (key,)).fetchone():
+        return False
+    # first sighting this run?
+    return staging.execute("INSERT OR IGNORE INTO streamed (key) VALUES (?)", (key,)).rowcount == 1
+
+async def streamed_candidates(queue):
+    global streaming
+    streaming = True
+    staged = candidates()
+    open_queue = True
+    while open_queue or staged is not None:
+        if open_queue and (staged is None or not queue.empty()):
+            ch = await queue.get()
+            if ch is None:
+                open_queue = False
+            elif take_streamed(ch):
+                progress.total += 1
+                yield ch
+            continue
+        ch = next(staged, None)
+        if ch is None:
+            staged = None
+        else:
+            yield ch
+
+# -----------------------------
+# Run
+# -----------------------------
+
+streaming = False
 
-# run main
-asyncio.run(main())
+def prepare(link_store=None):
+    """Open the stores and stage this run's candidates; pass `link_store` to share one."""
+    global links, health, staging, progress, report_out, n_skipped, streaming
+    global last_link_id, n_new, n_candidates
 
-# write valid links to playlist
-with open(OUTPUT_FILE, "w") as f:
-    f.write("#EXTM3U\n")
-    for url in valid_links:
-        f.write(f"#EXTINF:-1,Unknown\n{url}\n")
+    links = link_store if link_store is not None else LinkStore(LINKS_DB)
+    health = HealthStore(HEALTH_DB, legacy_playlist=OUTPUT_FILE)
+    staging = sqlite3.connect("")  # "" = temporary database backed by a temp file
+    staging.execute(
+        "CREATE TABLE candidates (key TEXT PRIMARY KEY, url TEXT, extinf TEXT, has_meta INTEGER)"
+    )
+    staging.execute("CREATE TABLE streamed (key TEXT PRIMARY KEY)")
+    n_skipped = 0
+    streaming = False
+    last_link_id, n_new = stage_candidates(links)
+    n_candidates = staging.execute("SELECT COUNT(*) FROM candidates").fetchone()[0]
+
+    progress = Progress(n_candidates)
+    # append-only while running; renamed over REPORT_FILE once the run ends
+    report_out = open(REPORT_FILE + ".part", "w", encoding="utf8")
+
+def publish():
+    """Write the playlist from health history, not just this run's snapshot."""
+    health.commit()
+    with open(OUTPUT_FILE + ".part", "w", encoding="utf8") as f:
+        n_published = write_channels(f, health.published())
+    os.replace(OUTPUT_FILE + ".part", OUTPUT_FILE)
+    return n_published
+
+def finish(finished, shared_links=False):
+    """Publish and close; a run that did not finish keeps the link cursor where it was."""
+    report_out.close()
+    os.replace(REPORT_FILE + ".part", REPORT_FILE)
+    n_published = publish()
+    health.close()
+    staging.close()
+
+    # only a completed run consumes the new links; a streamed run has also
+    # seen every link the crawler added while it ran
+    if finished:
+        links.mark_processed(STAGE, links.last_id() if streaming else last_link_id)
+    if not shared_links:
+        links.close()
+
+    progress.summary()
+    print(f"Tested {progress.valid + progress.failed} of {progress.total} links ({n_new} new, {n_skipped} skipped as not Bulgarian).")
+    print(f"Valid this run: {progress.valid}, published: {n_published}")
+
+def main():
+    # A cancelled job (SIGTERM from the runner) still publishes its partial
+    # results; signals can only be set up from the main thread
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    prepare()
+    finished = False
+    # a timeout or cancellation still publishes everything tested so far
+    try:
+        asyncio.run(asyncio.wait_for(test_all(candidates()), MAX_RUNTIME))
+        finished = True
+    except (asyncio.TimeoutError, KeyboardInterrupt):
+        print("Testing stopped early; publishing partial results.")
+    finally:
+        finish(finished)
 
-print(f"Total valid links: {len(valid_links)}")
+if __name__ == "__main__":
+    main()
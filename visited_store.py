@@ -0,0 +1,139 @@
+# visited_store.py
+# Persistent visit history used by crawler.py and recursive_expander.py in
+# place of visited.json / expander_visited.json.
+#
+# Backed by SQLite, so startup does not parse the whole history and lookups
+# hit an index. Writes are committed every COMMIT_EVERY updates (and on
+# close), so a job killed mid-run keeps everything up to the last flush.
+#
+# Each URL also carries a revisit schedule. record() compares a digest of
+# what the fetch produced with the previous one: a change halves the revisit
+# interval, no change or a failed fetch doubles it. due() hands back the URLs
+# whose interval has elapsed, most productive first.
+
+import json
+import time
+
+from common import SQLiteStore
+
+COMMIT_EVERY = 200
+
+MIN_INTERVAL = 6 * 3600         # one workflow period
+DEFAULT_INTERVAL = 24 * 3600
+MAX_INTERVAL = 30 * 24 * 3600
+
+COLUMNS = {
+    "interval": "REAL",
+    "next_due": "REAL",
+    "digest": "TEXT",
+    "visits": "INTEGER NOT NULL DEFAULT 0",
+    "changes": "INTEGER NOT NULL DEFAULT 0",
+    "fails": "INTEGER NOT NULL DEFAULT 0",
+}
+
+
+class VisitedStore(SQLiteStore):
+    commit_every = COMMIT_EVERY
+
+    def __init__(self, path, legacy_file=None):
+        super().__init__(path)
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS visited ("
+            " url TEXT PRIMARY KEY,"
+            " ts REAL NOT NULL) WITHOUT ROWID"
+        )
+        self._migrate()
+        if self.created and legacy_file:
+            self._import_legacy(legacy_file)
+
+    def _migrate(self):
+        """Scheduling columns, and a schedule for rows visited before they existed."""
+        self.add_columns("visited", COLUMNS)
+        # rows without a schedule are due DEFAULT_INTERVAL after their last visit
+        self.db.execute(
+            "UPDATE visited SET interval = ?, next_due = ts + ? WHERE next_due IS NULL",
+            (DEFAULT_INTERVAL, DEFAULT_INTERVAL),
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS visited_due ON visited (next_due)")
+        self.db.commit()
+
+    def _import_legacy(self, legacy_file):
+        """One-time migration of an old {url: timestamp} JSON file."""
+        try:
+            with open(legacy_file, "r", encoding="utf8") as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return
+        self.db.executemany(
+            "INSERT OR REPLACE INTO visited (url, ts, interval, next_due, visits)"
+            " VALUES (?, ?, ?, ?, 1)",
+            ((url, ts, DEFAULT_INTERVAL, ts + DEFAULT_INTERVAL) for url, ts in data.items()),
+        )
+        self.commit()
+        print(f"Visited: imported {len(data)} entries from {legacy_file}")
+
+    def __contains__(self, url):
+        return self.db.execute("SELECT 1 FROM visited WHERE url = ?", (url,)).fetchone() is not None
+
+    def get(self, url, default=None):
+        row = self.db.execute("SELECT ts FROM visited WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else default
+
+    def is_due(self, url, now=None):
+        """True if url was never visited or its revisit interval has elapsed."""
+        row = self.db.execute("SELECT next_due FROM visited WHERE url = ?", (url,)).fetchone()
+        return row is None or row[0] <= (now or time.time())
+
+    def record(self, url, digest=None, ok=True, now=None):
+        """
+        Store a visit and schedule the next one.
+        - digest: fingerprint of what the fetch yielded (e.g. hash of the stream
+          URLs found); compared with the previous digest to detect change
+        - ok: False when the fetch failed
+        """
+        now = now or time.time()
+        row = self.db.execute(
+            "SELECT interval, digest, visits, changes, fails FROM visited WHERE url = ?", (url,)
+        ).fetchone()
+        if row is None:
+            interval, visits, changes, fails = DEFAULT_INTERVAL, 0, 0, 0
+            if not ok:
+                fails = 1
+        else:
+            interval, old_digest, visits, changes, fails = row
+            interval = interval or DEFAULT_INTERVAL
+            if not ok:
+                fails += 1
+                interval *= 2
+                digest = old_digest
+            elif digest != old_digest:
+                changes += 1
+                fails = 0
+                interval /= 2
+            else:
+                fails = 0
+                interval *= 2
+        interval = min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+        self.db.execute(
+            "INSERT OR REPLACE INTO visited"
+            " (url, ts, interval, next_due, digest, visits, changes, fails)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, now, interval, now + interval, digest, visits + 1, changes, fails),
+        )
+        self._wrote()
+
+    def __setitem__(self, url, ts):
+        self.record(url, now=ts)
+
+    def due(self, limit, now=None):
+        """URLs whose revisit time has passed, highest change rate first."""
+        rows = self.db.execute(
+            "SELECT url FROM visited WHERE next_due <= ?"
+            " ORDER BY (changes + 1.0) / (visits + 1.0) DESC, next_due LIMIT ?",
+            (now or time.time(), limit),
+        )
+        return [r[0] for r in rows]
+
+    def __len__(self):
+        return self.db.execute("SELECT COUNT(*) FROM visited").fetchone()[0]